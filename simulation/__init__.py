@@ -0,0 +1,54 @@
+"""
+Hardware-free simulation backend for SensitiveEuroPi.
+
+install() registers stand-ins for the MicroPython and EuroPi modules the scripts
+import (machine, utime, micropython, ustruct, europi, europi_script) and puts the
+software directory on sys.path, so that sensitive_euro_pi.py and vl53l0x.py run
+unmodified under CPython:
+
+    import simulation
+    clock = simulation.install()
+    simulation.attach(simulation.VL53L0XModel(distance=250))
+    simulation.attach(simulation.BH1750Model(lux=400))
+    simulation.attach(simulation.HCSR04Model(distance=600))
+    from sensitive_euro_pi import SensitiveEuroPi
+"""
+
+import os
+import sys
+
+from . import clock as _clock
+from .clock import Clock, SimulationFinished
+from .i2c import Bus, I2CDevice, bus
+from .vl53l0x_model import VL53L0XModel
+from .bh1750_model import BH1750Model
+from .hcsr04_model import HCSR04Model
+from .tca9548a_model import TCA9548AModel
+
+SOFTWARE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "software")
+
+# the I2C peripheral SensitiveEuroPi uses for its sensors
+SENSOR_BUS = 1
+
+
+def install(clock=None):
+    """Make the simulated modules importable and return the active clock."""
+    from . import europi, europi_script, machine, micropython, ustruct, utime
+
+    _clock.current = clock or Clock()
+    sys.modules.update({
+        "machine": machine,
+        "utime": utime,
+        "micropython": micropython,
+        "ustruct": ustruct,
+        "europi": europi,
+        "europi_script": europi_script,
+    })
+    if SOFTWARE_DIR not in sys.path:
+        sys.path.insert(0, SOFTWARE_DIR)
+    return _clock.current
+
+
+def attach(device, bus_id=SENSOR_BUS):
+    """Plug a device model into a simulated I2C bus."""
+    return bus(bus_id).attach(device)
@@ -0,0 +1,55 @@
+"""
+Run SensitiveEuroPi against simulated sensors and print what the outputs did.
+
+    python -m simulation --seconds 5 --distance 250 --lux 400
+"""
+
+import argparse
+import math
+
+import simulation
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0, help="simulated run time")
+    parser.add_argument("--distance", type=float, default=None, help="fixed VL53L0X distance in mm (default: sweep)")
+    parser.add_argument("--sonic", type=float, default=None, help="fixed HC-SR04 distance in mm (default: sweep)")
+    parser.add_argument("--lux", type=float, default=None, help="fixed BH1750 illuminance (default: sweep)")
+    parser.add_argument("--no-vl53l0x", action="store_true", help="leave the VL53L0X unplugged")
+    parser.add_argument("--no-bh1750", action="store_true", help="leave the BH1750 unplugged")
+    parser.add_argument("--no-hcsr04", action="store_true", help="leave the HC-SR04 unplugged")
+    parser.add_argument("--cpu-scale", type=float, default=0.0,
+                        help="advance simulated time by CPython execution time times this factor")
+    args = parser.parse_args()
+
+    clock = simulation.install(simulation.Clock(cpu_scale=args.cpu_scale))
+    distance = args.distance if args.distance is not None else (lambda us: 500 + 400 * math.sin(us / 1e6))
+    sonic = args.sonic if args.sonic is not None else (lambda us: 600 + 500 * math.sin(us / 1.3e6))
+    lux = args.lux if args.lux is not None else (lambda us: 10 ** (2 + 1.5 * math.sin(us / 7e5)))
+    if not args.no_vl53l0x:
+        simulation.attach(simulation.VL53L0XModel(distance=distance))
+    if not args.no_bh1750:
+        simulation.attach(simulation.BH1750Model(lux=lux))
+    if not args.no_hcsr04:
+        simulation.attach(simulation.HCSR04Model(distance=sonic))
+
+    from europi import cvs, oled
+    from sensitive_euro_pi import SensitiveEuroPi
+
+    script = SensitiveEuroPi()
+    clock.limit_us = clock.now_us() + int(args.seconds * 1e6)
+    try:
+        script.main()
+    except simulation.SimulationFinished:
+        pass
+
+    for index, cv in enumerate(cvs, 1):
+        print(f"cv{index}: {cv.writes:6d} writes, last {cv.voltage():.2f} V")
+    print(f"oled: {oled.show_count} frames, last {oled.shown}")
+    bus = simulation.bus(simulation.SENSOR_BUS)
+    print(f"i2c: {bus.transactions} transactions, {bus.bytes} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+End-to-end benchmark of SensitiveEuroPi against the simulated sensors.
+
+Every scenario runs SensitiveEuroPi.main() for a fixed number of task runs in its
+own process (the simulated buses and devices are module level) and reports
+
+* loop rate: scheduler task runs per simulated second,
+* sensor-to-CV latency: time from a result becoming available in the device
+  model to the next write of the sensor's CV output (percentiles in µs),
+* I2C transactions and bytes per sample for every active sensor,
+* time spent in Sensor.display_reading() and oled.show().
+
+Times are simulated µs unless named host_us (CPython time, only useful to
+compare runs on the same machine).
+
+    python -m simulation.benchmark --passes 20000 --output bench.json
+    python -m simulation.benchmark --baseline bench.json
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import simulation
+
+# saved script state, additional models to attach and the pin wired to the VL53L0X's GPIO1
+SCENARIOS = {
+    "vl53l0x_continuous": {"state": {"LToF": {"continuous": True}}},
+    "vl53l0x_single": {"state": {"LToF": {"continuous": False}}},
+    "vl53l0x_gpio1": {"state": {"LToF": {"continuous": True, "gpio1_pin": 22}}, "gpio1_pin": 22},
+    "gy302_continuous": {"state": {"LUX": {"mode": "continuous_high_res"}}},
+    "gy302_low_res": {"state": {"LUX": {"mode": "continuous_low_res"}}},
+    "display_off": {"state": {"LToF": {"continuous": True}, "display_fps": 0}},
+    "output_engine": {"state": {"LToF": {"continuous": True}, "output_rate_hz": 1000}},
+}
+
+DISTANCE_MM = lambda us: 500 + 400 * ((us // 1000) % 1000) / 1000
+LUX = lambda us: 50 + 10 * ((us // 1000) % 500)
+
+# numbers compared against a baseline, with True if larger is better
+KEY_METRICS = {
+    "loops_per_s": True,
+    "oled_show.us": False,
+}
+SENSOR_METRICS = {
+    "samples_per_s": True,
+    "latency_us.p50": False,
+    "latency_us.p99": False,
+    "transactions_per_sample": False,
+}
+
+
+def percentiles(values, points=(50, 90, 99)):
+    if not values:
+        return {}
+    values = sorted(values)
+    result = {f"p{point}": values[min(len(values) - 1, len(values) * point // 100)] for point in points}
+    result["max"] = values[-1]
+    return result
+
+
+def latencies(result_times, history, start_us):
+    """Time from every result to the first following change of the output.
+
+    Outputs are rewritten on every poll, so only writes with a new voltage count.
+    """
+    writes = [t for (t, voltage), (_, previous) in zip(history[1:], history) if t >= start_us and voltage != previous]
+    result = []
+    index = 0
+    for ready in result_times:
+        if ready < start_us:
+            continue
+        while index < len(writes) and writes[index] < ready:
+            index += 1
+        if index == len(writes):
+            break
+        result.append(writes[index] - ready)
+    return result
+
+
+class Timed:
+    """Wrap a function and sum up the simulated and host time spent in it."""
+
+    def __init__(self, clock, function):
+        self.clock = clock
+        self.function = function
+        self.calls = 0
+        self.us = 0
+        self.host_us = 0.0
+
+    def __call__(self, *args):
+        start, host_start = self.clock.now_us(), time.perf_counter()
+        try:
+            return self.function(*args)
+        finally:
+            self.calls += 1
+            self.us += self.clock.now_us() - start
+            self.host_us += (time.perf_counter() - host_start) * 1e6
+
+    def report(self):
+        return {
+            "calls": self.calls,
+            "us": self.us,
+            "host_us": round(self.host_us),
+            "us_per_call": round(self.us / self.calls, 1) if self.calls else 0,
+            "host_us_per_call": round(self.host_us / self.calls, 1) if self.calls else 0,
+        }
+
+
+def run_scenario(name, passes, cpu_scale):
+    scenario = SCENARIOS[name]
+    clock = simulation.install(simulation.Clock(cpu_scale=cpu_scale))
+    import machine
+    gpio1 = machine.Pin(scenario["gpio1_pin"]) if "gpio1_pin" in scenario else None
+    models = {
+        0x29: simulation.attach(simulation.VL53L0XModel(distance=DISTANCE_MM, gpio1=gpio1)),
+        0x23: simulation.attach(simulation.BH1750Model(lux=LUX)),
+    }
+    models.update({model.address: simulation.attach(model) for model in scenario.get("models", ())})
+
+    import europi
+    import europi_script
+    import sensitive_euro_pi
+    from sensor import Sensor
+    europi_script.saved_states["SensitiveEuroPi"] = json.dumps(scenario["state"])
+    script = sensitive_euro_pi.SensitiveEuroPi()
+
+    display_reading = Timed(clock, Sensor.display_reading)
+    Sensor.display_reading = lambda sensor: display_reading(sensor)
+    show = Timed(clock, europi.oled.show)
+    europi.oled.show = show
+
+    bus = simulation.bus(simulation.SENSOR_BUS)
+    bus.reset_counters()
+    start_us = clock.now_us() + sensitive_euro_pi.SPLASH_MS * 1000
+    host_start = time.perf_counter()
+    script.main(passes)
+    elapsed_us = clock.now_us() - start_us
+    host_elapsed = time.perf_counter() - host_start
+
+    sensors = {}
+    for sensor in script.sensors:
+        if not sensor.active:
+            continue
+        model = models[sensor.i2c_address]
+        samples = len([t for t in model.result_times if t >= start_us])
+        transactions, payload = bus.by_address.get(sensor.i2c_address, (0, 0))
+        sensors[sensor.name] = {
+            "class": type(sensor).__name__,
+            "samples": samples,
+            "samples_per_s": round(samples * 1e6 / elapsed_us, 1),
+            "transactions_per_sample": round(transactions / samples, 2) if samples else None,
+            "bytes_per_sample": round(payload / samples, 2) if samples else None,
+            "latency_us": percentiles(latencies(model.result_times, sensor.output.history, start_us)),
+        }
+    return {
+        "scenario": name,
+        "passes": passes,
+        "elapsed_us": elapsed_us,
+        "host_s": round(host_elapsed, 3),
+        "loops_per_s": round(passes * 1e6 / elapsed_us, 1),
+        "tasks": {task.name: {"runs": task.runs, "overruns": task.overruns, "max_us": task.max_us}
+                  for task in script.scheduler.tasks},
+        "sensors": sensors,
+        "display_reading": display_reading.report(),
+        "oled_show": show.report(),
+    }
+
+
+def lookup(values, key):
+    for part in key.split("."):
+        values = values.get(part) if isinstance(values, dict) else None
+    return values
+
+
+def compare(results, baseline):
+    """Print the relative change of the key metrics against an earlier run."""
+    previous = {result["scenario"]: result for result in baseline}
+    for result in results:
+        old = previous.get(result["scenario"])
+        if old is None:
+            continue
+        rows = [("", key, larger_is_better, result, old) for key, larger_is_better in KEY_METRICS.items()]
+        rows += [(name, key, larger_is_better, sensor, old["sensors"].get(name, {}))
+                 for name, sensor in result["sensors"].items()
+                 for key, larger_is_better in SENSOR_METRICS.items()]
+        for name, key, larger_is_better, new, old_values in rows:
+            new_value, old_value = lookup(new, key), lookup(old_values, key)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value * 100
+            worse = change < 0 if larger_is_better else change > 0
+            flag = " (worse)" if worse and abs(change) > 5 else ""
+            print(f"{result['scenario']:20s} {name:5s} {key:24s} {old_value:>10} -> {new_value:>10}"
+                  f" {change:+6.1f}%{flag}")
+
+
+def summary(result):
+    print(f"{result['scenario']:20s} {result['loops_per_s']:9.1f} loops/s,"
+          f" show {result['oled_show']['calls']} x {result['oled_show']['us_per_call']} us,"
+          f" display_reading {result['display_reading']['host_us_per_call']} host us")
+    for name, sensor in result["sensors"].items():
+        latency = sensor["latency_us"]
+        print(f"    {name:5s} {sensor['samples_per_s']:7.1f} samples/s,"
+              f" {sensor['transactions_per_sample']} tx / {sensor['bytes_per_sample']} bytes per sample,"
+              f" latency p50 {latency.get('p50')} p99 {latency.get('p99')} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--passes", type=int, default=20000, help="scheduler task runs per scenario")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="run only this scenario (repeatable)")
+    parser.add_argument("--cpu-scale", type=float, default=0.0,
+                        help="advance simulated time by CPython execution time times this factor")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against the JSON results of an earlier run")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        json.dump(run_scenario(args.scenario[0], args.passes, args.cpu_scale), sys.stdout)
+        return
+
+    results = []
+    for name in args.scenario or SCENARIOS:
+        output = subprocess.run(
+            [sys.executable, "-m", "simulation.benchmark", "--child", "--scenario", name,
+             "--passes", str(args.passes), "--cpu-scale", str(args.cpu_scale)],
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+        result = json.loads(output.splitlines()[-1])
+        summary(result)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Command-level model of the BH1750 ambient light sensor (GY-302 breakout)."""
+
+from . import clock as _clock
+from .i2c import I2CDevice
+
+POWER_DOWN = 0x00
+POWER_ON = 0x01
+RESET = 0x07
+MTREG_HIGH = 0x40
+MTREG_LOW = 0x60
+MTREG_DEFAULT = 69
+
+# command: (continuous, typical conversion time in µs at the default MTreg, counts per lux)
+MODES = {
+    0x10: (True, 120000, 1.2),
+    0x11: (True, 120000, 2.4),
+    0x13: (True, 16000, 1.2),
+    0x20: (False, 120000, 1.2),
+    0x21: (False, 120000, 2.4),
+    0x23: (False, 16000, 1.2),
+}
+
+
+class BH1750Model(I2CDevice):
+    """
+    Every write is a one byte command. Measurement commands start an integration
+    whose duration scales with MTreg; the sensor returns the last completed result
+    as two big-endian bytes, followed by 0xFF if more bytes are clocked out.
+
+    lux is either a number or a callable taking the time in µs.
+    """
+
+    def __init__(self, address=0x23, lux=200):
+        super().__init__(address)
+        self.lux = lux
+        self.mtreg = MTREG_DEFAULT
+        self.powered = False
+        self.mode = None
+        self.counts = 0
+        self.result_times = []
+        self._generation = 0
+
+    def conversion_us(self, command):
+        return MODES[command][1] * self.mtreg // MTREG_DEFAULT
+
+    def write(self, data):
+        for command in data:
+            self._command(command)
+
+    def read(self, size):
+        data = bytes(((self.counts >> 8) & 0xFF, self.counts & 0xFF))
+        return (data + b"\xff" * size)[:size]
+
+    def _command(self, command):
+        if command == POWER_DOWN:
+            self.powered = False
+            self._stop()
+        elif command == POWER_ON:
+            self.powered = True
+        elif command == RESET:
+            if self.powered:
+                self.counts = 0
+        elif command & 0xF8 == MTREG_HIGH:
+            self.mtreg = (self.mtreg & 0x1F) | ((command & 0x07) << 5)
+        elif command & 0xE0 == MTREG_LOW:
+            self.mtreg = (self.mtreg & 0xE0) | (command & 0x1F)
+        elif command in MODES:
+            self.powered = True
+            self.mode = command
+            self._generation += 1
+            self._schedule()
+
+    def _stop(self):
+        self.mode = None
+        self._generation += 1
+
+    def _schedule(self):
+        generation = self._generation
+        def complete():
+            if generation == self._generation:
+                self._complete()
+        _clock.current.call_later(self.conversion_us(self.mode), complete)
+
+    def _complete(self):
+        now = _clock.current.now_us()
+        continuous, _, counts_per_lux = MODES[self.mode]
+        lux = self.lux(now) if callable(self.lux) else self.lux
+        counts = int(lux * counts_per_lux * self.mtreg / MTREG_DEFAULT)
+        if self.mode == 0x13 or self.mode == 0x23:
+            counts -= counts % 4  # low resolution mode has a 4 lx step
+        self.counts = min(max(counts, 0), 0xFFFF)
+        self.result_times.append(now)
+        if continuous:
+            self._schedule()
+        else:
+            self.mode = None
+            self.powered = False
@@ -0,0 +1,99 @@
+"""
+Simulated time base shared by the fake MicroPython modules and the device models.
+
+By default the clock is virtual: it only advances when the script sleeps, when a
+simulated bus transfer takes place or (scaled by cpu_scale) while CPython executes
+script code. This keeps runs deterministic and much faster than real time. With
+realtime=True the clock follows the host's monotonic clock instead, which is what
+CPython's asyncio expects.
+"""
+
+import heapq
+import itertools
+import time
+
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+
+class SimulationFinished(BaseException):
+    """Raised by the clock when its time limit is reached.
+
+    Derived from BaseException so that it passes through the script's own
+    `except Exception` recovery paths.
+    """
+
+
+class Clock:
+    def __init__(self, realtime=False, cpu_scale=0.0):
+        self.realtime = realtime
+        self.cpu_scale = 1.0 if realtime else cpu_scale
+        self.limit_us = None
+        self._now_us = 0.0
+        self._last_real = time.perf_counter()
+        self._events = []
+        self._sequence = itertools.count()
+        self._dispatching = False
+
+    def now_us(self):
+        real = time.perf_counter()
+        if self.cpu_scale:
+            self._advance_to(self._now_us + (real - self._last_real) * 1e6 * self.cpu_scale)
+        self._last_real = real
+        return int(self._now_us)
+
+    def sleep_us(self, us):
+        if us <= 0:
+            self.now_us()
+        elif self.realtime:
+            time.sleep(us / 1e6)
+            self.now_us()
+        else:
+            self.now_us()
+            self._advance_to(self._now_us + us)
+
+    def spend_us(self, us):
+        """Account for time the hardware is busy, e.g. a bus transfer."""
+        if self.realtime:
+            self.now_us()
+        else:
+            self._advance_to(self._now_us + us)
+
+    def call_at(self, us, callback):
+        """Run callback() once the clock reaches the given time in µs."""
+        heapq.heappush(self._events, (us, next(self._sequence), callback))
+        if us <= self._now_us:
+            self._dispatch(self._now_us)
+
+    def call_later(self, delay_us, callback):
+        self.call_at(self._now_us + delay_us, callback)
+
+    def _advance_to(self, target):
+        self._dispatch(target)
+        self._now_us = max(self._now_us, target)
+        if self.limit_us is not None and self._now_us >= self.limit_us:
+            raise SimulationFinished()
+
+    def _dispatch(self, target):
+        if self._dispatching:
+            return
+        self._dispatching = True
+        try:
+            while self._events and self._events[0][0] <= target:
+                due, _, callback = heapq.heappop(self._events)
+                self._now_us = max(self._now_us, due)
+                callback()
+        finally:
+            self._dispatching = False
+
+
+current = Clock()
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MAX
@@ -0,0 +1,152 @@
+"""Stand-in for the EuroPi firmware's europi module with recording outputs and display."""
+
+from . import clock as _clock
+
+OLED_WIDTH = 128
+OLED_HEIGHT = 32
+CHAR_WIDTH = 8
+CHAR_HEIGHT = 8
+MAX_OUTPUT_VOLTAGE = 10
+MIN_OUTPUT_VOLTAGE = 0
+MAX_UINT16 = 65535
+
+# SSD1306 128x32 framebuffer push on the 400 kHz display bus, incl. command overhead
+OLED_SHOW_US = int((OLED_WIDTH * OLED_HEIGHT // 8 + 8) * 9 * 1000000 / 400000)
+
+
+class Display:
+    width = OLED_WIDTH
+    height = OLED_HEIGHT
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.texts = {}
+        self.shown = []
+        self.show_count = 0
+        self.show_us = 0
+        self.operations = 0
+
+    def fill(self, colour):
+        self.operations += 1
+        if colour == 0:
+            self.texts = {}
+
+    def fill_rect(self, x, y, w, h, colour):
+        self.operations += 1
+        if colour == 0:
+            self.texts = {position: text for position, text in self.texts.items()
+                          if not (x <= position[0] < x + w and y <= position[1] < y + h)}
+
+    def rect(self, x, y, w, h, colour):
+        self.operations += 1
+
+    def hline(self, x, y, w, colour):
+        self.operations += 1
+
+    def vline(self, x, y, h, colour):
+        self.operations += 1
+
+    def pixel(self, x, y, colour=None):
+        self.operations += 1
+
+    def text(self, string, x, y, colour=1):
+        self.operations += 1
+        self.texts[(x, y)] = string
+
+    def contrast(self, value):
+        pass
+
+    def show(self):
+        _clock.current.spend_us(OLED_SHOW_US)
+        self.show_count += 1
+        self.show_us += OLED_SHOW_US
+        self.shown = [text for _, text in sorted(self.texts.items(), key=lambda item: (item[0][1], item[0][0]))]
+
+    def centre_text(self, text):
+        self.fill(0)
+        lines = str(text).split("\n")
+        for index, line in enumerate(lines):
+            self.text(line, (OLED_WIDTH - len(line) * CHAR_WIDTH) // 2, index * CHAR_HEIGHT, 1)
+        self.show()
+
+
+class Button:
+    def __init__(self, pin):
+        self.pin = pin
+        self.debounce_delay = 200
+        self._handler = None
+        self._handler_falling = None
+        self.pressed = False
+
+    def handler(self, func):
+        self._handler = func
+
+    def handler_falling(self, func):
+        self._handler_falling = func
+
+    def value(self):
+        return 1 if self.pressed else 0
+
+    def press(self):
+        """Simulate a full press and release of the button."""
+        self.pressed = True
+        if self._handler:
+            self._handler()
+        self.pressed = False
+        if self._handler_falling:
+            self._handler_falling()
+
+
+class Output:
+    def __init__(self, pin, history=True):
+        self.pin = pin
+        self._voltage = 0.0
+        self._duty = 0
+        self.history = [] if history else None
+        self.writes = 0
+
+    def voltage(self, voltage=None):
+        if voltage is None:
+            return self._voltage
+        self._voltage = min(max(voltage, MIN_OUTPUT_VOLTAGE), MAX_OUTPUT_VOLTAGE)
+        self._duty = int(self._voltage * MAX_UINT16 / MAX_OUTPUT_VOLTAGE)
+        self._record()
+
+    def _set_duty(self, cycle):
+        # the PWM write voltage() ends in on the firmware (uncalibrated here)
+        self._duty = min(max(int(cycle), 0), MAX_UINT16)
+        self._voltage = self._duty * MAX_OUTPUT_VOLTAGE / MAX_UINT16
+        self._record()
+
+    def _record(self):
+        self.writes += 1
+        if self.history is not None:
+            self.history.append((_clock.current.now_us(), self._voltage))
+
+    def on(self):
+        self.voltage(MAX_OUTPUT_VOLTAGE // 2)
+
+    def off(self):
+        self.voltage(0)
+
+    def toggle(self):
+        self.value(0 if self.value() else 1)
+
+    def value(self, value=None):
+        if value is None:
+            return 1 if self._voltage > 0 else 0
+        self.on() if value else self.off()
+
+
+oled = Display()
+b1 = Button(4)
+b2 = Button(5)
+cv1 = Output(21)
+cv2 = Output(20)
+cv3 = Output(16)
+cv4 = Output(17)
+cv5 = Output(18)
+cv6 = Output(19)
+cvs = [cv1, cv2, cv3, cv4, cv5, cv6]
@@ -0,0 +1,26 @@
+"""Stand-in for the EuroPi firmware's europi_script module with in-memory state storage."""
+
+import json
+
+from . import clock as _clock
+
+saved_states = {}
+
+
+class EuroPiScript:
+    def __init__(self):
+        self._last_saved = 0
+
+    @classmethod
+    def display_name(cls):
+        return cls.__name__
+
+    def load_state_json(self):
+        return json.loads(saved_states.get(self.__class__.__name__, "{}"))
+
+    def save_state_json(self, state):
+        saved_states[self.__class__.__name__] = json.dumps(state)
+        self._last_saved = _clock.current.now_us() // 1000
+
+    def last_saved(self):
+        return _clock.current.now_us() // 1000 - self._last_saved
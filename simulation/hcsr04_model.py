@@ -0,0 +1,53 @@
+"""Command-level model of the I2C version of the HC-SR04 ultrasonic distance sensor."""
+
+from . import clock as _clock
+from .i2c import I2CDevice
+
+TRIGGER = 0x01
+SPEED_OF_SOUND_MM_PER_US = 0.343
+SETTLE_US = 40000  # the module's own processing after the echo
+
+
+class HCSR04Model(I2CDevice):
+    """
+    Writing 0x01 starts a measurement, which is done after the echo's round trip
+    plus the module's processing time. Reads return the last completed result as
+    the distance in µm, three big-endian bytes. Without an echo (nothing in range)
+    the result is 0.
+
+    distance is in mm, either a number, None for no echo, or a callable taking the
+    time in µs.
+    """
+
+    def __init__(self, address=0x57, distance=300, max_range_mm=4500):
+        super().__init__(address)
+        self.distance = distance
+        self.max_range_mm = max_range_mm
+        self.micrometers = 0
+        self.measuring = False
+        self.triggers = 0
+        self.result_times = []
+
+    def conversion_us(self, distance):
+        echo_us = 2 * (distance if distance is not None else self.max_range_mm) / SPEED_OF_SOUND_MM_PER_US
+        return int(echo_us) + SETTLE_US
+
+    def write(self, data):
+        if data and data[0] == TRIGGER and not self.measuring:
+            self.triggers += 1
+            self.measuring = True
+            now = _clock.current.now_us()
+            distance = self.distance(now) if callable(self.distance) else self.distance
+            if distance is not None and not 0 < distance <= self.max_range_mm:
+                distance = None
+            _clock.current.call_later(self.conversion_us(distance), lambda: self._complete(distance))
+
+    def read(self, size):
+        micrometers = self.micrometers
+        data = bytes(((micrometers >> 16) & 0xFF, (micrometers >> 8) & 0xFF, micrometers & 0xFF))
+        return (data + b"\x00" * size)[:size]
+
+    def _complete(self, distance):
+        self.measuring = False
+        self.micrometers = int(distance * 1000) if distance is not None else 0
+        self.result_times.append(_clock.current.now_us())
@@ -0,0 +1,105 @@
+"""Simulated I2C buses and the base class for register-level device models."""
+
+import errno
+
+from . import clock as _clock
+
+_buses = {}
+
+
+class I2CDevice:
+    """Base class for device models.
+
+    A bus transaction is presented to the model as a raw write (the first byte is
+    the register address or command) and/or a raw read continuing from the current
+    register pointer, which is how the devices behave on the wire.
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self.bus = None
+        self.fail = False  # raise EIO on every access, e.g. an unplugged TRRS cable
+        self.stall_us = 0  # clock stretching per transaction, e.g. a hanging device
+        self.in_reset = False  # doesn't answer, another device may use its address
+
+    def route(self, address):
+        """The device behind this one that answers at the address, e.g. on a multiplexer channel."""
+        return None
+
+    def write(self, data):
+        pass
+
+    def read(self, size):
+        return bytes(size)
+
+
+class Bus:
+    """The shared wire behind all machine.I2C objects created with the same id."""
+
+    def __init__(self, freq=400000):
+        self.freq = freq
+        self.devices = []
+        self.transactions = 0
+        self.bytes = 0
+        self.by_address = {}
+
+    def attach(self, device):
+        device.bus = self
+        self.devices.append(device)
+        return device
+
+    def detach(self, address):
+        device = self.find(address)
+        self.devices.remove(device)
+        device.bus = None
+        return device
+
+    def readdress(self, device, address):
+        device.address = address
+
+    def find(self, address):
+        """The device answering at the address, directly on the bus or behind a multiplexer."""
+        for device in self.devices:
+            if device.address == address and not device.in_reset:
+                return device
+        for device in self.devices:
+            routed = device.route(address)
+            if routed is not None:
+                return routed
+        return None
+
+    def device(self, address, payload, timeout_us=None):
+        """Account for one transaction and return the addressed device.
+
+        A device that stalls the bus for longer than the controller's timeout raises
+        ETIMEDOUT after that time.
+        """
+        # start + address byte + payload bytes (9 bits each incl. ACK) + stop
+        bits = 2 + 9 * (1 + payload)
+        _clock.current.spend_us(bits * 1000000 / self.freq)
+        self.transactions += 1
+        self.bytes += payload
+        counters = self.by_address.setdefault(address, [0, 0])
+        counters[0] += 1
+        counters[1] += payload
+        device = self.find(address)
+        if device is None or device.fail:
+            raise OSError(errno.EIO)
+        if device.stall_us:
+            if timeout_us is not None and device.stall_us > timeout_us:
+                _clock.current.spend_us(timeout_us)
+                raise OSError(errno.ETIMEDOUT)
+            _clock.current.spend_us(device.stall_us)
+        return device
+
+    def reset_counters(self):
+        self.transactions = 0
+        self.bytes = 0
+        self.by_address = {}
+
+
+def bus(id):
+    """Return the simulated bus for an I2C peripheral id."""
+    if id not in _buses:
+        _buses[id] = Bus()
+    return _buses[id]
@@ -0,0 +1,170 @@
+"""Stand-in for MicroPython's machine module (the parts used by the scripts)."""
+
+from . import clock as _clock
+from .i2c import bus as _bus
+
+
+def freq(hz=None):
+    return 125000000
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    _pins = {}
+
+    def __new__(cls, id, *args, **kwargs):
+        # like the hardware, all Pin objects with the same id share one line,
+        # so a device model can drive the pin the script listens on
+        if id not in cls._pins:
+            pin = cls._pins[id] = super().__new__(cls)
+            pin._value = 0
+            pin._handler = None
+            pin._trigger = 0
+            pin._driven = False
+        return cls._pins[id]
+
+    def __init__(self, id, mode=IN, pull=None, value=None):
+        self.id = id
+        self.mode = mode
+        self.pull = pull
+        if pull == Pin.PULL_UP and not self._driven:
+            self._value = 1
+        if value is not None:
+            self._value = value
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self.drive(value)
+
+    def on(self):
+        self.drive(1)
+
+    def off(self):
+        self.drive(0)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self._handler = handler
+        self._trigger = trigger
+
+    def drive(self, value):
+        """Set the pin level from outside, e.g. from a device model's interrupt line."""
+        value = 1 if value else 0
+        self._driven = True
+        previous, self._value = self._value, value
+        if self._handler is None or previous == value:
+            return
+        if (value and self._trigger & Pin.IRQ_RISING) or (not value and self._trigger & Pin.IRQ_FALLING):
+            self._handler(self)
+
+
+class ADC:
+    CORE_TEMP = 4
+
+    temperature = 27.0  # of the RP2040, in °C, read through CORE_TEMP
+
+    def __init__(self, id):
+        self.id = id
+
+    def read_u16(self):
+        if self.id != ADC.CORE_TEMP:
+            return 0
+        volts = 0.706 - (ADC.temperature - 27) * 0.001721
+        return int(volts * 65535 / 3.3)
+
+
+class I2C:
+    def __init__(self, id=0, scl=None, sda=None, freq=400000, timeout=50000):
+        self.id = id
+        self.timeout = timeout
+        self._bus = _bus(id)
+        self._bus.freq = freq
+
+    def scan(self):
+        found = []
+        for address in range(0x08, 0x78):
+            try:
+                self._bus.device(address, 0, self.timeout)
+            except OSError:
+                continue
+            found.append(address)
+        return found
+
+    def readfrom_mem(self, addr, memaddr, nbytes, *, addrsize=8):
+        device = self._bus.device(addr, 2 + nbytes, self.timeout)  # register write + repeated start
+        device.write(bytes((memaddr,)))
+        return bytes(device.read(nbytes))
+
+    def readfrom_mem_into(self, addr, memaddr, buf, *, addrsize=8):
+        buf[:] = self.readfrom_mem(addr, memaddr, len(buf))
+
+    def writeto_mem(self, addr, memaddr, buf, *, addrsize=8):
+        device = self._bus.device(addr, 1 + len(buf), self.timeout)
+        device.write(bytes((memaddr,)) + bytes(buf))
+
+    def readfrom(self, addr, nbytes, stop=True):
+        return bytes(self._bus.device(addr, nbytes, self.timeout).read(nbytes))
+
+    def readfrom_into(self, addr, buf, stop=True):
+        buf[:] = self.readfrom(addr, len(buf))
+
+    def writeto(self, addr, buf, stop=True):
+        device = self._bus.device(addr, len(buf), self.timeout)
+        if len(buf):
+            device.write(bytes(buf))
+        return len(buf) + 1
+
+    def writevto(self, addr, vector, stop=True):
+        return self.writeto(addr, b"".join(bytes(buf) for buf in vector), stop)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self._generation = 0
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, freq=None, period=None, callback=None, tick_hz=1000):
+        self.deinit()
+        self._period_us = int(1000000 / freq) if freq else int(period * 1000000 / tick_hz)
+        self._mode = mode
+        self._callback = callback
+        self._schedule(self._generation)
+
+    def deinit(self):
+        self._generation += 1
+
+    def _schedule(self, generation):
+        def fire():
+            if generation != self._generation:
+                return
+            if self._mode == Timer.PERIODIC:
+                self._schedule(generation)
+            self._callback(self)
+        _clock.current.call_later(self._period_us, fire)
+
+
+class WDT:
+    def __init__(self, id=0, timeout=5000):
+        self.timeout_us = timeout * 1000
+        self.feed()
+
+    def feed(self):
+        self.last_fed_us = _clock.current.now_us()
+
+    @property
+    def expired(self):
+        return _clock.current.now_us() - self.last_fed_us > self.timeout_us
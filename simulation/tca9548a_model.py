@@ -0,0 +1,39 @@
+"""Model of the TCA9548A I2C multiplexer."""
+
+from .i2c import Bus, I2CDevice
+
+CHANNELS = 8
+
+
+class TCA9548AModel(I2CDevice):
+    """
+    The multiplexer has a single control register, one bit per downstream channel.
+    Devices are attached to a channel and answer on the upstream bus while their
+    channel is enabled. Transfers are accounted for on the upstream bus.
+    """
+
+    def __init__(self, address=0x70):
+        super().__init__(address)
+        self.mask = 0
+        self.channels = [Bus() for _ in range(CHANNELS)]
+        self.switches = 0
+
+    def attach(self, channel, device):
+        """Plug a device model into a downstream channel."""
+        return self.channels[channel].attach(device)
+
+    def write(self, data):
+        if data:
+            self.mask = data[-1]
+            self.switches += 1
+
+    def read(self, size):
+        return bytes((self.mask,)) * size
+
+    def route(self, address):
+        for channel, bus in enumerate(self.channels):
+            if self.mask >> channel & 1:
+                device = bus.find(address)
+                if device is not None:
+                    return device
+        return None
@@ -0,0 +1,39 @@
+"""
+Stand-in for MicroPython's ustruct module.
+
+MicroPython silently truncates integers that do not fit the packed field, where
+CPython's struct raises. The device drivers rely on the MicroPython behaviour.
+"""
+
+import struct
+from struct import calcsize, unpack, unpack_from, pack_into as _pack_into
+
+_SIZES = {"b": 8, "B": 8, "h": 16, "H": 16, "i": 32, "I": 32, "l": 32, "L": 32, "q": 64, "Q": 64}
+
+
+def _truncate(fmt, values):
+    codes = []
+    count = ""
+    for c in fmt:
+        if c.isdigit():
+            count += c
+        elif c.isalpha() or c == "?":
+            codes.extend([c] if c in "sp" else [c] * int(count or 1))
+            count = ""
+    result = []
+    for code, value in zip(codes, values):
+        bits = _SIZES.get(code)
+        if bits and isinstance(value, int):
+            value &= (1 << bits) - 1
+            if code.islower() and value >= 1 << (bits - 1):
+                value -= 1 << bits
+        result.append(value)
+    return result
+
+
+def pack(fmt, *values):
+    return struct.pack(fmt, *_truncate(fmt, values))
+
+
+def pack_into(fmt, buffer, offset, *values):
+    _pack_into(fmt, buffer, offset, *_truncate(fmt, values))
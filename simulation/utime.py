@@ -0,0 +1,36 @@
+"""Stand-in for MicroPython's utime module, driven by the simulation clock."""
+
+from . import clock as _clock
+from .clock import ticks_add, ticks_diff, TICKS_MAX
+
+
+def ticks_us():
+    return _clock.current.now_us() & TICKS_MAX
+
+
+def ticks_ms():
+    return (_clock.current.now_us() // 1000) & TICKS_MAX
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def time():
+    return _clock.current.now_us() // 1000000
+
+
+def time_ns():
+    return _clock.current.now_us() * 1000
+
+
+def sleep_us(us):
+    _clock.current.sleep_us(us)
+
+
+def sleep_ms(ms):
+    _clock.current.sleep_us(ms * 1000)
+
+
+def sleep(seconds):
+    _clock.current.sleep_us(int(seconds * 1000000))
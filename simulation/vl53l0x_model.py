@@ -0,0 +1,232 @@
+"""Register-level model of the VL53L0X time-of-flight ranging sensor."""
+
+from . import clock as _clock
+from .i2c import I2CDevice
+
+SYSRANGE_START = 0x00
+SYSTEM_SEQUENCE_CONFIG = 0x01
+SYSTEM_INTERMEASUREMENT_PERIOD = 0x04
+SYSTEM_INTERRUPT_CLEAR = 0x0B
+RESULT_INTERRUPT_STATUS = 0x13
+RESULT_RANGE_STATUS = 0x14
+PRE_RANGE_CONFIG_VCSEL_PERIOD = 0x50
+PRE_RANGE_CONFIG_TIMEOUT_MACROP_HI = 0x51
+FINAL_RANGE_CONFIG_VCSEL_PERIOD = 0x70
+FINAL_RANGE_CONFIG_TIMEOUT_MACROP_HI = 0x71
+MSRC_CONFIG_TIMEOUT_MACROP = 0x46
+I2C_SLAVE_DEVICE_ADDRESS = 0x8A
+IDENTIFICATION_MODEL_ID = 0xC0
+IDENTIFICATION_REVISION_ID = 0xC2
+VHV_SETTINGS = 0xCB
+PHASE_CAL = 0xEE
+PAGE_SELECT = 0xFF
+
+RANGE_STATUS_VALID = 11
+RANGE_STATUS_SIGNAL_FAIL = 4
+RANGE_STATUS_PHASE_FAIL = 6
+OUT_OF_RANGE_MM = 8190
+
+CALIBRATION_US = 2000
+
+
+def _decode_timeout(value):
+    return ((value & 0xFF) << (value >> 8)) + 1
+
+
+def _macro_period_ns(vcsel_period_pclks):
+    return (2304 * vcsel_period_pclks * 1655 + 500) // 1000
+
+
+class VL53L0XModel(I2CDevice):
+    """
+    The model keeps a paged register file (register 0xFF selects the page) and
+    emulates the parts of the device the driver relies on: the stop variable and
+    SPAD info handshake during init, VHV/phase calibration, single-shot, back-to-back
+    and timed ranging with a conversion time derived from the programmed timeouts,
+    the interrupt status/clear protocol, the result block, the GPIO1 data-ready
+    line (active low) and the address register. With an XSHUT pin the sensor is
+    in reset while the pin is low and comes back at 0x29 with its power up
+    registers.
+
+    distance is either a number in mm or a callable taking the time in µs.
+    """
+
+    def __init__(self, address=0x29, distance=300, max_range_mm=1200, gpio1=None, xshut=None,
+                 stop_variable=0x3C, spad_info=0x85):
+        super().__init__(address)
+        self.default_address = address
+        self.distance = distance
+        self.max_range_mm = max_range_mm
+        self.gpio1 = gpio1
+        self.power_up_registers = {
+            (1, 0x91): stop_variable,
+            (7, 0x92): spad_info,
+            (0, IDENTIFICATION_MODEL_ID): 0xEE,
+            (0, IDENTIFICATION_REVISION_ID): 0x10,
+            (0, PRE_RANGE_CONFIG_VCSEL_PERIOD): 0x06,
+            (0, FINAL_RANGE_CONFIG_VCSEL_PERIOD): 0x04,
+            (0, SYSTEM_SEQUENCE_CONFIG): 0xE8,
+        }
+        self.registers = dict(self.power_up_registers)
+        self.page = 0
+        self.pointer = 0
+        self.mode = None
+        self.interrupt = False
+        self.result = bytes(12)
+        self.result_times = []  # µs timestamps at which results became available
+        self.calibrations = 0
+        self._generation = 0
+        if xshut is not None:
+            xshut.irq(handler=self._xshut, trigger=xshut.IRQ_FALLING | xshut.IRQ_RISING)
+            self.in_reset = not xshut.value()
+
+    def _xshut(self, pin):
+        if pin.value():
+            self.in_reset = False
+            return
+        # reset: stop ranging and forget the configuration, including the address
+        self.in_reset = True
+        self._generation += 1
+        self.registers = dict(self.power_up_registers)
+        self.page = 0
+        self.mode = None
+        self.interrupt = False
+        self.address = self.default_address
+
+    def _get(self, register, page=None):
+        return self.registers.get((self.page if page is None else page, register), 0)
+
+    def _get16(self, register):
+        return (self._get(register, 0) << 8) | self._get(register + 1, 0)
+
+    def conversion_us(self):
+        """Ranging time as set up by the timing budget and VCSEL period registers."""
+        sequence = self._get(SYSTEM_SEQUENCE_CONFIG, 0)
+        pre_pclks = (self._get(PRE_RANGE_CONFIG_VCSEL_PERIOD, 0) + 1) << 1
+        final_pclks = (self._get(FINAL_RANGE_CONFIG_VCSEL_PERIOD, 0) + 1) << 1
+        pre_mclks = _decode_timeout(self._get16(PRE_RANGE_CONFIG_TIMEOUT_MACROP_HI))
+        final_mclks = _decode_timeout(self._get16(FINAL_RANGE_CONFIG_TIMEOUT_MACROP_HI))
+        msrc_mclks = self._get(MSRC_CONFIG_TIMEOUT_MACROP, 0) + 1
+        us = 1910 + 960
+        if sequence & 0x1C:
+            us += msrc_mclks * _macro_period_ns(pre_pclks) // 1000 + 660
+        if sequence & 0x40:
+            us += pre_mclks * _macro_period_ns(pre_pclks) // 1000 + 660
+            final_mclks -= pre_mclks
+        if sequence & 0x80:
+            us += max(final_mclks, 1) * _macro_period_ns(final_pclks) // 1000 + 550
+        return us
+
+    def write(self, data):
+        self.pointer = data[0]
+        for value in data[1:]:
+            self._write_register(self.pointer, value)
+            self.pointer = (self.pointer + 1) & 0xFF
+
+    def read(self, size):
+        data = bytearray()
+        for _ in range(size):
+            data.append(self._read_register(self.pointer))
+            self.pointer = (self.pointer + 1) & 0xFF
+        return bytes(data)
+
+    def _write_register(self, register, value):
+        if register == PAGE_SELECT:
+            self.page = value
+            return
+        self.registers[(self.page, register)] = value
+        if self.page != 0:
+            return
+        if register == SYSRANGE_START:
+            self._start(value)
+        elif register == SYSTEM_INTERRUPT_CLEAR and value & 0x01:
+            self.interrupt = False
+            if self.gpio1 is not None:
+                self.gpio1.drive(1)
+        elif register == I2C_SLAVE_DEVICE_ADDRESS and self.bus is not None:
+            self.bus.readdress(self, value & 0x7F)
+
+    def _read_register(self, register):
+        if self.page == 0:
+            if register == SYSRANGE_START:
+                return 0  # start bit self-clears immediately
+            if register == RESULT_INTERRUPT_STATUS:
+                return 0x04 if self.interrupt else 0x00
+            if RESULT_RANGE_STATUS <= register < RESULT_RANGE_STATUS + 12:
+                return self.result[register - RESULT_RANGE_STATUS]
+        if self.page == 7 and register == 0x83:
+            return self._get(register) | 0x10  # SPAD info handshake is always ready
+        return self._get(register)
+
+    def _start(self, value):
+        self._generation += 1
+        if value & 0x01:
+            if self.mode in ("continuous", "timed"):
+                self.mode = None  # writing the single-shot bit stops continuous ranging
+                return
+            sequence = self._get(SYSTEM_SEQUENCE_CONFIG, 0)
+            if value & 0x40 or sequence in (0x01, 0x02):
+                self.mode = "calibration"
+                self._schedule(CALIBRATION_US)
+            else:
+                self.mode = "single"
+                self._schedule(self.conversion_us())
+        elif value & 0x02:
+            self.mode = "continuous"
+            self._schedule(self.conversion_us())
+        elif value & 0x04:
+            self.mode = "timed"
+            self._schedule(self._period_us())
+        else:
+            self.mode = None
+
+    def _period_us(self):
+        period_ms = (self._get(SYSTEM_INTERMEASUREMENT_PERIOD, 0) << 8) | self._get(SYSTEM_INTERMEASUREMENT_PERIOD + 1, 0)
+        return max(self.conversion_us(), period_ms * 1000)
+
+    def _schedule(self, delay_us):
+        generation = self._generation
+        def complete():
+            if generation == self._generation:
+                self._complete()
+        _clock.current.call_later(delay_us, complete)
+
+    def _complete(self):
+        now = _clock.current.now_us()
+        if self.mode == "calibration":
+            self.calibrations += 1
+            self.registers[(0, VHV_SETTINGS)] = 0x1D
+            self.registers[(0, PHASE_CAL)] = 0x2B
+        else:
+            self._latch(now)
+        self.interrupt = True
+        if self.gpio1 is not None:
+            self.gpio1.drive(0)
+        if self.mode == "continuous":
+            self._schedule(self.conversion_us())
+        elif self.mode == "timed":
+            self._schedule(self._period_us())
+        else:
+            self.mode = None
+
+    def _latch(self, now):
+        distance = self.distance(now) if callable(self.distance) else self.distance
+        distance = int(distance)
+        if 0 <= distance <= self.max_range_mm:
+            status = RANGE_STATUS_VALID
+            signal_rate = max(1, 40000 // max(distance, 20))  # 9.7 fixed point MCPS
+        else:
+            status = RANGE_STATUS_SIGNAL_FAIL
+            distance = OUT_OF_RANGE_MM
+            signal_rate = 0
+        ambient_rate = 0x0040
+        spads = 0x0800  # 8.8 fixed point
+        self.result = bytes((
+            (status << 3) | 0x06, 0x00,
+            spads >> 8, spads & 0xFF,
+            0x00, 0x00,
+            (signal_rate >> 8) & 0xFF, signal_rate & 0xFF,
+            ambient_rate >> 8, ambient_rate & 0xFF,
+            distance >> 8, distance & 0xFF,
+        ))
+        self.result_times.append(now)
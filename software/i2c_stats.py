@@ -0,0 +1,131 @@
+"""
+Instrumented I2C bus for Sensitive EuroPi
+
+InstrumentedI2C wraps a machine.I2C object and counts transactions, bytes, errors
+and the time spent per device address and per register, so the drivers can use it
+without code changes. Every address also gets a histogram of its transaction times.
+A write without memory address (e.g. a register/value pair or a command) is counted
+for its first byte, a plain read only for the device.
+"""
+
+from micropython import const
+from utime import ticks_diff, ticks_us
+
+TRANSACTIONS = const(0)
+BYTES = const(1)
+ERRORS = const(2)
+US = const(3)
+HISTOGRAM = const(4)
+
+# upper bounds (us) of the histogram buckets, the last bucket takes everything above
+HISTOGRAM_BOUNDS = (100, 200, 500, 1000, 2000, 5000)
+
+
+def _with_addrsize(function, addr, memaddr, data, addrsize):
+    return function(addr, memaddr, data, addrsize=addrsize)
+
+
+class InstrumentedI2C:
+    def __init__(self, i2c):
+        self.i2c = i2c
+        self.reset()
+
+    def reset(self):
+        self.addresses = {}  # address -> [transactions, bytes, errors, us, histogram...]
+        self.registers = {}  # address << 8 | register -> [transactions, bytes, errors, us]
+
+    def scan(self):
+        return self.i2c.scan()
+
+    # addrsize is keyword-only in machine.I2C, it is passed on only if it isn't the default
+    def readfrom_mem(self, addr, memaddr, nbytes, *, addrsize=8):
+        if addrsize != 8:
+            return self._transfer(addr, memaddr, nbytes, _with_addrsize, self.i2c.readfrom_mem,
+                                  addr, memaddr, nbytes, addrsize)
+        return self._transfer(addr, memaddr, nbytes, self.i2c.readfrom_mem, addr, memaddr, nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, *, addrsize=8):
+        if addrsize != 8:
+            return self._transfer(addr, memaddr, len(buf), _with_addrsize, self.i2c.readfrom_mem_into,
+                                  addr, memaddr, buf, addrsize)
+        return self._transfer(addr, memaddr, len(buf), self.i2c.readfrom_mem_into, addr, memaddr, buf)
+
+    def writeto_mem(self, addr, memaddr, buf, *, addrsize=8):
+        if addrsize != 8:
+            return self._transfer(addr, memaddr, len(buf), _with_addrsize, self.i2c.writeto_mem,
+                                  addr, memaddr, buf, addrsize)
+        return self._transfer(addr, memaddr, len(buf), self.i2c.writeto_mem, addr, memaddr, buf)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        return self._transfer(addr, None, nbytes, self.i2c.readfrom, addr, nbytes, stop)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        return self._transfer(addr, None, len(buf), self.i2c.readfrom_into, addr, buf, stop)
+
+    def writeto(self, addr, buf, stop=True):
+        register = buf[0] if len(buf) else None
+        return self._transfer(addr, register, len(buf), self.i2c.writeto, addr, buf, stop)
+
+    def writevto(self, addr, vector, stop=True):
+        size = 0
+        for buf in vector:
+            size += len(buf)
+        return self._transfer(addr, None, size, self.i2c.writevto, addr, vector, stop)
+
+    def _transfer(self, address, register, size, function, *args):
+        start = ticks_us()
+        error = True
+        try:
+            result = function(*args)
+            error = False
+            return result
+        finally:
+            self._record(address, register, size, ticks_diff(ticks_us(), start), error)
+
+    def _record(self, address, register, size, us, error):
+        stats = self.addresses.get(address)
+        if stats is None:
+            stats = self.addresses[address] = [0] * (HISTOGRAM + len(HISTOGRAM_BOUNDS) + 1)
+        self._count(stats, size, us, error)
+        bucket = 0
+        for bound in HISTOGRAM_BOUNDS:
+            if us <= bound:
+                break
+            bucket += 1
+        stats[HISTOGRAM + bucket] += 1
+        if register is not None:
+            key = address << 8 | register
+            stats = self.registers.get(key)
+            if stats is None:
+                stats = self.registers[key] = [0, 0, 0, 0]
+            self._count(stats, size, us, error)
+
+    def _count(self, stats, size, us, error):
+        stats[TRANSACTIONS] += 1
+        if error:
+            stats[ERRORS] += 1
+        else:
+            stats[BYTES] += size
+        stats[US] += us
+
+    def lines(self):
+        """Short lines for the debug page of the OLED."""
+        lines = ["I2C tx ms err"]
+        for address in sorted(self.addresses):
+            stats = self.addresses[address]
+            lines.append(f"{address:02x} {stats[TRANSACTIONS]} {stats[US] // 1000} {stats[ERRORS]}")
+        return lines
+
+    def dump(self, registers=5):
+        """Print the stats per address and for its busiest registers."""
+        for address in sorted(self.addresses):
+            stats = self.addresses[address]
+            histogram = "/".join(str(count) for count in stats[HISTOGRAM:])
+            print(f"i2c 0x{address:02x}: {stats[TRANSACTIONS]} tx {stats[BYTES]} B {stats[ERRORS]} err"
+                  f" {stats[US]} us [{histogram}]")
+            busiest = sorted((key for key in self.registers if key >> 8 == address),
+                             key=lambda key: self.registers[key][US], reverse=True)
+            for key in busiest[:registers]:
+                stats = self.registers[key]
+                print(f"  0x{key & 0xff:02x}: {stats[TRANSACTIONS]} tx {stats[BYTES]} B {stats[ERRORS]} err"
+                      f" {stats[US]} us")
@@ -0,0 +1,98 @@
+"""
+Memory manager for Sensitive EuroPi
+
+Automatic garbage collection can kick in at any allocation and pause the loop for
+several milliseconds, i.e. right when a new reading should go out. The memory
+manager switches it off for the main loop and collects in idle windows instead:
+after an OLED push, while paused, or when the heap runs low (checked from a low
+rate task). Code that allocates a lot, like re-initialising the sensors or saving
+the state, runs inside `with memory:`, which turns automatic collection with
+gc.threshold back on for its duration. The blocks may nest and may run on both
+cores at once, the last one to leave switches it off again.
+
+With automatic collection off, an allocation that doesn't fit raises MemoryError
+right away instead of collecting first. The scheduler and the sensor sampling
+catch it and call out_of_memory(), which collects, so the loop loses a run but
+keeps going. This is the safety net while gc.threshold has no effect.
+
+Free and allocated heap, the number of collections and the longest pause are kept
+for a debug page. On CPython (simulation) the heap figures are not available.
+"""
+
+import gc
+from _thread import allocate_lock
+from utime import ticks_diff, ticks_us
+
+IDLE_COLLECT_BYTES = 4096  # collect in an idle window once this much was allocated
+RESERVE_BYTES = 16384  # collect right away if less is free
+THRESHOLD_BYTES = 16384  # automatic collection while it is enabled
+
+
+class MemoryManager:
+    def __init__(self):
+        self.collections = 0
+        self.emergencies = 0
+        self.last_pause_us = 0
+        self.max_pause_us = 0
+        self.collected_at = 0  # heap in use after the last collection
+        self.depth = 0
+        self.lock = allocate_lock()  # depth is shared by both cores in the dual core runtime
+        if hasattr(gc, "threshold"):
+            gc.threshold(THRESHOLD_BYTES)
+
+    def start(self):
+        self.collect()
+        gc.disable()
+
+    def allocated(self):
+        return gc.mem_alloc() if hasattr(gc, "mem_alloc") else 0
+
+    def free(self):
+        return gc.mem_free() if hasattr(gc, "mem_free") else 0
+
+    def collect(self):
+        start = ticks_us()
+        gc.collect()
+        pause = ticks_diff(ticks_us(), start)
+        self.collections += 1
+        self.last_pause_us = pause
+        if pause > self.max_pause_us:
+            self.max_pause_us = pause
+        self.collected_at = self.allocated()
+
+    def idle(self):
+        """Collect if worthwhile, call this when a pause doesn't hurt."""
+        if self.allocated() - self.collected_at > IDLE_COLLECT_BYTES:
+            self.collect()
+
+    def check(self):
+        """Safety net for a heap that runs low between idle windows."""
+        if hasattr(gc, "mem_free") and gc.mem_free() < RESERVE_BYTES:
+            self.emergencies += 1
+            self.collect()
+
+    def out_of_memory(self):
+        """Recover from a MemoryError raised while automatic collection was off."""
+        self.emergencies += 1
+        self.collect()
+
+    def __enter__(self):
+        with self.lock:
+            self.depth += 1
+            gc.enable()
+        return self
+
+    def __exit__(self, *args):
+        with self.lock:
+            self.depth -= 1
+            if not self.depth:
+                gc.disable()
+
+    def lines(self):
+        """Short lines for the debug page of the OLED."""
+        return [
+            f"free {self.free()}",
+            f"used {self.allocated()}",
+            f"gc {self.collections} !{self.emergencies}",
+            f"pause {self.max_pause_us}us",
+        ]
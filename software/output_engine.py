@@ -0,0 +1,105 @@
+"""
+Output engine for Sensitive EuroPi
+
+Sensor readings arrive at the sensor's rate (30 to 60 Hz for the VL53L0X, a few Hz
+for the GY302). Written directly, the CV steps at that rate. The output engine
+takes the readings as targets and updates the outputs from a machine.Timer at a
+fixed, higher rate:
+
+* linear: ramps from the current value to the new reading over the time between
+  the last two readings (delays the CV by one sensor sample),
+* slew: glides towards the new reading with a time constant of slew_ms.
+
+Values are kept as integer fixed point millivolts (<< 8), and an output is only
+written when its value moves by at least one step of the PWM DAC. The timer
+interrupt writes the PWM duty cycle, interpolated in integers between the duty
+cycles of the whole volts, as voltage() would allocate floats.
+"""
+
+from europi import MAX_OUTPUT_VOLTAGE
+from machine import Timer
+from utime import ticks_diff, ticks_ms
+
+FRACTION_BITS = 8
+DAC_STEP_MV = 8  # EuroPi PWM, about 1250 levels over 10 V
+MAX_RAMP_MS = 500  # a sensor that was quiet for a while doesn't make the ramp crawl
+
+try:
+    # the duty cycle of every whole volt, which voltage() interpolates between
+    from europi import OUTPUT_CALIBRATION_VALUES as DUTIES
+except ImportError:
+    DUTIES = [volts * 0xffff // MAX_OUTPUT_VOLTAGE for volts in range(MAX_OUTPUT_VOLTAGE + 1)]
+GRADIENTS = [DUTIES[volts + 1] - DUTIES[volts] for volts in range(MAX_OUTPUT_VOLTAGE)] + [0]
+
+
+class Channel:
+    def __init__(self, output, engine):
+        self.output = output
+        self.engine = engine
+        self.value = 0
+        self.target = 0
+        self.step = 0
+        self.remaining = 0
+        self.level = -1
+        self.updated = ticks_ms()
+        self.set_duty = output._set_duty  # bound once, not in every interrupt
+
+    def set(self, millivolts):
+        """Take a new reading as the target of the output."""
+        now = ticks_ms()
+        interval = min(max(ticks_diff(now, self.updated), 1), MAX_RAMP_MS)
+        self.updated = now
+        target = millivolts << FRACTION_BITS
+        if self.engine.linear:
+            ticks = max(interval * self.engine.rate_hz // 1000, 1)
+            # the timer interrupt may come in between, it leaves the ramp alone until it is complete
+            self.remaining = 0
+            self.target = target
+            self.step = (target - self.value) // ticks
+            self.remaining = ticks
+        else:
+            self.target = target
+
+    def tick(self):
+        if self.engine.linear:
+            if not self.remaining:
+                return
+            self.remaining -= 1
+            self.value = self.target if not self.remaining else self.value + self.step
+        else:
+            step = (self.target - self.value) * self.engine.alpha >> FRACTION_BITS
+            self.value = self.value + step if step else self.target
+        millivolts = self.value >> FRACTION_BITS
+        level = millivolts // DAC_STEP_MV
+        if level != self.level:
+            self.level = level
+            volts = min(millivolts // 1000, MAX_OUTPUT_VOLTAGE)
+            self.set_duty(DUTIES[volts] + GRADIENTS[volts] * (millivolts - volts * 1000) // 1000)
+
+
+class OutputEngine:
+    def __init__(self, rate_hz, mode="linear", slew_ms=20):
+        self.rate_hz = rate_hz
+        self.linear = mode != "slew"
+        tick_ms = 1000 / rate_hz
+        # share of the remaining distance covered per tick
+        self.alpha = max(int((1 << FRACTION_BITS) * tick_ms / (slew_ms + tick_ms)), 1)
+        self.channels = []
+        self.timer = None
+
+    def add(self, output):
+        channel = Channel(output, self)
+        self.channels.append(channel)
+        return channel
+
+    def start(self):
+        self.timer = Timer(freq=self.rate_hz, mode=Timer.PERIODIC, callback=self.tick)
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.deinit()
+            self.timer = None
+
+    def tick(self, timer=None):
+        for channel in self.channels:
+            channel.tick()
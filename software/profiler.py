@@ -0,0 +1,111 @@
+"""
+Hot path profiler for Sensitive EuroPi
+
+Every stage (a scheduler task or a phase within one, e.g. the display push) keeps
+its last durations in a fixed size array('H') ring buffer, so recording allocates
+nothing. Durations are in us and saturate at 65535. All recorded stages also go
+through one short ring of (stage, duration) events, which is frozen as the worst
+case trace whenever a new longest duration comes in.
+
+Where gc.mem_alloc() is available, the heap growth during every run is tracked as
+well, the steady state loop should allocate nothing.
+
+Statistics (min/mean/p99) are only computed on demand.
+"""
+
+from array import array
+
+try:
+    from gc import mem_alloc
+except ImportError:
+    mem_alloc = None  # e.g. CPython
+
+MAX_US = 65535
+
+
+class Profiler:
+    def __init__(self, size=128, trace_size=16):
+        self.size = size
+        self.names = []
+        self.buffers = []
+        self.indices = []
+        self.counts = []
+        self.maxima = []
+        self.allocations = []  # most bytes allocated in one run
+        self.trace_size = trace_size
+        self.trace_stages = array('B', bytes(trace_size))
+        self.trace_us = array('H', bytes(2 * trace_size))
+        self.trace_index = 0
+        self.worst_stages = array('B', bytes(trace_size))
+        self.worst_us = array('H', bytes(2 * trace_size))
+        self.worst = 0
+
+    def stage(self, name):
+        """Register a stage and return the index to record it with."""
+        self.names.append(name)
+        self.buffers.append(array('H', bytes(2 * self.size)))
+        self.indices.append(0)
+        self.counts.append(0)
+        self.maxima.append(0)
+        self.allocations.append(0)
+        return len(self.names) - 1
+
+    def allocated(self):
+        """Current heap usage to pass to record(), if known."""
+        return mem_alloc() if mem_alloc else None
+
+    def record(self, stage, us, allocated=None):
+        if allocated is not None:
+            allocated = mem_alloc() - allocated  # negative if a collection ran
+            if allocated > self.allocations[stage]:
+                self.allocations[stage] = allocated
+        if us > MAX_US:
+            us = MAX_US
+        index = self.indices[stage]
+        self.buffers[stage][index] = us
+        self.indices[stage] = (index + 1) % self.size
+        self.counts[stage] += 1
+        if us > self.maxima[stage]:
+            self.maxima[stage] = us
+        index = self.trace_index
+        self.trace_stages[index] = stage
+        self.trace_us[index] = us
+        self.trace_index = (index + 1) % self.trace_size
+        if us > self.worst:
+            self.worst = us
+            # oldest event first, the worst one is the last
+            for i in range(self.trace_size):
+                index = (self.trace_index + i) % self.trace_size
+                self.worst_stages[i] = self.trace_stages[index]
+                self.worst_us[i] = self.trace_us[index]
+
+    def stats(self, stage):
+        """Min, mean and p99 of the buffered durations of a stage (None if not run yet)."""
+        count = min(self.counts[stage], self.size)
+        if not count:
+            return None
+        values = sorted(self.buffers[stage][:count])
+        return values[0], sum(values) // count, values[count * 99 // 100]
+
+    def trace(self):
+        """The events that led up to the longest duration, as (name, us) pairs."""
+        return [(self.names[stage], us) for stage, us in zip(self.worst_stages, self.worst_us) if us]
+
+    def lines(self):
+        """Short lines for the debug page of the OLED, the slowest stages first."""
+        stages = [stage for stage in range(len(self.names)) if self.counts[stage]]
+        stages.sort(key=lambda stage: self.stats(stage)[2], reverse=True)
+        lines = ["stage  mean  p99"]
+        for stage in stages:
+            _, mean, p99 = self.stats(stage)
+            lines.append(f"{self.names[stage][:6]:6s}{mean:5d}{p99:6d}")
+        return lines
+
+    def dump(self):
+        """Print the stats of all stages and the worst case trace."""
+        for stage, name in enumerate(self.names):
+            stats = self.stats(stage)
+            if stats:
+                print(f"profile {name}: {self.counts[stage]} runs, min {stats[0]} mean {stats[1]}"
+                      f" p99 {stats[2]} max {self.maxima[stage]} us, alloc max {self.allocations[stage]} B")
+        print("profile worst: " + " ".join(f"{name} {us}" for name, us in self.trace()))
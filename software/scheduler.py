@@ -0,0 +1,102 @@
+"""
+Cooperative scheduler for the Sensitive EuroPi main loop
+
+Every task runs at its own period. The task with the earliest due time runs next
+(ticks wrap around, so the due times are compared with ticks_diff instead of being
+kept in a heap). A run that takes longer than the task's latency budget is counted
+as an overrun. With a profiler, the duration of every run is recorded for the task's
+stage as well, together with the bytes it allocated.
+
+With a memory manager, a task that runs out of heap (automatic garbage collection
+is off in the loop) has it collected instead of stopping the loop.
+
+Tasks can be put in groups, e.g. the sensors on one channel of an I2C multiplexer.
+Of the grouped tasks that are due at the same time, those of the group that ran last
+go first, so a group's tasks run back to back without delaying anything.
+"""
+
+from utime import sleep_ms, ticks_add, ticks_diff, ticks_ms, ticks_us
+
+
+class Task:
+    def __init__(self, name, function, period_ms, budget_us, group=None):
+        self.name = name
+        self.function = function
+        self.period_ms = period_ms
+        self.budget_us = budget_us
+        self.group = group
+        self.due = ticks_ms()
+        self.runs = 0
+        self.overruns = 0
+        self.max_us = 0
+        self.stage = None
+
+    def __str__(self):
+        return f"{self.name}: {self.runs} runs, {self.overruns} overruns, max {self.max_us} us"
+
+
+class Scheduler:
+    def __init__(self, profiler=None, memory=None):
+        self.tasks = []
+        self.profiler = profiler
+        self.memory = memory
+        self.group = None  # of the last task that had one
+
+    def add(self, name, function, period_ms, budget_us, group=None):
+        task = Task(name, function, period_ms, budget_us, group)
+        if self.profiler is not None:
+            task.stage = self.profiler.stage(name)
+        self.tasks.append(task)
+        return task
+
+    def next_task(self):
+        earliest = None
+        group = self.group
+        for task in self.tasks:
+            if earliest is None:
+                earliest = task
+                continue
+            wait = ticks_diff(task.due, earliest.due)
+            # a tie between two groups goes to the one that ran last
+            if wait < 0 or (not wait and earliest.group is not None and task.group == group):
+                earliest = task
+        return earliest
+
+    def run_once(self):
+        now = ticks_ms()
+        task = self.next_task()
+        wait = ticks_diff(task.due, now)
+        if wait > 0:
+            sleep_ms(wait)
+            return None
+        profiler = self.profiler
+        if profiler is not None:
+            allocated = profiler.allocated()
+        start = ticks_us()
+        try:
+            task.function()
+        except MemoryError:
+            if self.memory is None:
+                raise
+            self.memory.out_of_memory()
+        elapsed = ticks_diff(ticks_us(), start)
+        task.runs += 1
+        if elapsed > task.max_us:
+            task.max_us = elapsed
+        if elapsed > task.budget_us:
+            task.overruns += 1
+        if profiler is not None:
+            profiler.record(task.stage, elapsed, allocated)
+        if task.group is not None:
+            self.group = task.group
+        # keep a steady rate, but don't try to catch up on runs that are already late
+        task.due = ticks_add(task.due, task.period_ms)
+        if ticks_diff(task.due, now) < 0:
+            task.due = ticks_add(now, task.period_ms)
+        return task
+
+    def run(self, passes=None):
+        """Run tasks forever, or until the given number of task runs is done."""
+        while passes is None or passes > 0:
+            if self.run_once() is not None and passes is not None:
+                passes -= 1
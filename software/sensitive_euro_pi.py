@@ -11,7 +11,7 @@ knob_1: adjust the value of the current configuration parameter
 knob_2: not used
 
 button_1: enable/disable sensor readings
-button_2: cycle through editable configuration parameters
+button_2: cycle through the display pages (sensor readings and enabled debug pages)
 
 output_1: VL53L0X CV
 output_2: HC-SR04 CV
@@ -20,157 +20,63 @@ output_4: VL53L0X gate (CV valid)
 output_5: HC-SR04 gate (CV valid)
 output_6: GY302 gate (CV valid)
 
+The sensors and their outputs can be configured with a "sensors" list in the saved
+state, e.g. for up to six distance and light sensors on the channels of a TCA9548A
+multiplexer (see DEFAULT_SENSORS).
+
 """
 
-from time import sleep
-from math import log
-from europi import oled, b1, cv1, cv2, cv3, cv4, cv5, cv6, OLED_WIDTH, OLED_HEIGHT, CHAR_HEIGHT
+from europi import oled, b1, b2, cvs, OLED_HEIGHT, CHAR_HEIGHT
 from europi_script import EuroPiScript
-from machine import Pin, I2C
-from vl53l0x import VL53L0X
-from utime import ticks_diff, ticks_ms
-from collections import namedtuple
+from machine import Pin, I2C, WDT
+from sensor_registry import DRIVERS, PendingSensor, create_sensor
+from scheduler import Scheduler
+from memory import MemoryManager
+from utime import sleep_ms, ticks_add, ticks_diff, ticks_ms, ticks_us
 
 VERSION = "0.2"
+SPLASH_MS = 1000
 
 I2C_ID = 1
 I2C_SDA_PIN = 2
 I2C_SCL_PIN = 3
-
-SensorReading = namedtuple("SensorReading", "valid value")
-
-class Sensor:
-    active = False
-    reading = SensorReading(False, 0)
-    def __init__(self, index, name, description, i2c_address, output, gate):
-        self.index = index
-        self.name = name
-        self.description = description
-        self.i2c_address = i2c_address
-        self.output = output
-        self.output.voltage(0)
-        self.gate = gate
-        self.gate.off()
-
-    def __str__(self):
-        status = f"@ 0x{self.i2c_address:x}" if self.active else "not connected"
-        return f"{self.name} ({self.description}) {status}"
-
-    def reset(self):
-        self.i2c = None
-        self.state = None
-        self.active = False
-
-    def activate(self, i2c, state):
-        self.i2c = i2c
-        self.state = state
-        self.active = True
-
-    def display_reading(self):
-        column_width = int((OLED_WIDTH - 8)/3)
-        padding_x = self.index * column_width + 4
-        padding_y = 0
-        oled.text(f"{self.name:>4}", padding_x, padding_y, 1)
-        padding_y = 12
-        if self.active:
-            oled.text(f"{self.reading.value:.2f}", padding_x, padding_y, 1)
-        else:
-            oled.text("  -  ", padding_x, padding_y, 1)
-        padding_y = 24
-        oled.fill_rect(padding_x, padding_y, int(self.reading.value / 10 * column_width), 4, 1)
-
-    def update(self):
-        if self.active:
-            self.reading = self.get_reading()
-            if self.reading.valid:
-                self.output.voltage(self.reading.value)
-            self.gate.value(self.reading.valid)
-
-    def get_reading(self):
-        return SensorReading(False, 0)
-
-
-class LaserDistanceSensorVL53L0X(Sensor):
-    OFFSET_MM = 30
-    MAX_MM = 999
-    MAX_VOLTAGE = 9.99
-    pre_periods = [12, 14, 16, 18]
-    final_periods = [8, 10, 12, 14]
-
-    def __init__(self, output, gate):
-        super().__init__(0, "LToF", "Laser distance sensor VL53L0X", 0x29, output, gate)
-
-    def activate(self, i2c, state):
-        # Pre: 12 to 18 (initialized to 14 by default)
-        self.pre_period = state.get("pre_period", 14)  # TODO: This should be configurable by UI
-        # Final: 8 to 14 (initialized to 10 by default)
-        self.final_period = state.get("final_period", 10)  # TODO: This should be configurable by UI
-
-        self.vl53l0x = VL53L0X(i2c)
-        self.config()
-        super().activate(i2c, state)
-
-    def get_reading(self):
-        distance = min(max(self.vl53l0x.ping() - self.OFFSET_MM, 0), self.MAX_MM)
-        voltage = distance / self.MAX_MM * self.MAX_VOLTAGE
-        if voltage < self.MAX_VOLTAGE:
-            return SensorReading(True, voltage)
-        else:
-            return SensorReading(False, 0)
-
-    def config(self):
-        self.vl53l0x.set_Vcsel_pulse_period(self.vl53l0x.vcsel_period_type[0], self.pre_period)
-        self.vl53l0x.set_Vcsel_pulse_period(self.vl53l0x.vcsel_period_type[1], self.final_period)
-        
-
-class SonicDistanceSensorHCSR04(Sensor):
-    def __init__(self, output, gate):
-        super().__init__(1, "SON", "Sonic distance sensor HC-SR04", 0x57, output, gate)
-
-    def activate(self, i2c, state):
-        super().activate(i2c, state)
-
-
-class LightSensorGY302(Sensor):
-    ticks_last_reading = 0
-    last_voltage = 0
-    MEASUREMENT_DURATION = 110
-    CONTINUOUS_LOW_RES_MODE = 0x13
-    CONTINUOUS_HIGH_RES_MODE_1 = 0x10
-    CONTINUOUS_HIGH_RES_MODE_2 = 0x11
-    ONE_TIME_HIGH_RES_MODE_1 = 0x20
-    ONE_TIME_HIGH_RES_MODE_2 = 0x21
-    ONE_TIME_LOW_RES_MODE = 0x23
-
-    def __init__(self, output, gate):
-        super().__init__(2, "LUX", "Brightness sensor GY302 (BH1750)", 0x23, output, gate)
-
-    def activate(self, i2c, state):
-        super().activate(i2c, state)
-        
-    def convert_to_number(self, data):
-        return data[1] + (256 * data[0])
-
-    def read_light(self):
-        data = self.i2c.readfrom_mem(self.i2c_address, self.ONE_TIME_HIGH_RES_MODE_1, 3)            
-        return self.convert_to_number(data)
-
-    def get_reading(self):
-        ticks = ticks_ms()
-        if ticks_diff(ticks, self.ticks_last_reading) > self.MEASUREMENT_DURATION:
-            self.last_voltage = log(1 + self.read_light()) # this gives a scale from 0 to about 11
-            self.ticks_last_reading = ticks
-        return SensorReading(True, self.last_voltage)
+I2C_TIMEOUT_US = 5000  # a device that stretches the clock longer fails the transfer
+
+DEFAULT_DISPLAY_FPS = 12  # 0 switches the display off
+DISPLAY_BUDGET_US = 20000
+SAVE_PERIOD_MS = 5000
+SAVE_BUDGET_US = 100000
+RECOVERY_PERIOD_MS = 250  # probes one sensor per run
+RECOVERY_BUDGET_US = 10000  # a step of a re-initialisation, e.g. of a VL53L0X
+DEBUG_PAGE_PERIOD_MS = 500  # debug pages change all the time, don't let them eat the loop
+I2C_DUMP_PERIOD_MS = 10000
+I2C_DUMP_BUDGET_US = 50000
+PROFILE_DUMP_PERIOD_MS = 10000
+PROFILE_DUMP_BUDGET_US = 50000
+MEMORY_PERIOD_MS = 100
+MEMORY_BUDGET_US = 10000
+WATCHDOG_FEED_PERIOD_MS = 100
+WATCHDOG_FEED_BUDGET_US = 100
+
+
+class Overrun(Exception):
+    """A sensor operation took longer than the sensor's watchdog budget (in us)."""
+    pass
+
+
+# Outputs and gates are numbered 1 to 6. Further keys: "name" (unique, also keys the
+# sensor's settings), "address", "mux_channel" (0 to 7 on a TCA9548A at "mux_address"
+# of the state) and, for the VL53L0X, "xshut_pin". The types are the ones in the
+# DRIVERS of sensor_registry.
+DEFAULT_SENSORS = [
+    {"type": "vl53l0x", "output": 1, "gate": 4},
+    {"type": "hcsr04", "output": 2, "gate": 5},
+    {"type": "gy302", "output": 3, "gate": 6},
+]
 
 
 class SensitiveEuroPi(EuroPiScript):
 
-    sensors = [
-        LaserDistanceSensorVL53L0X(cv1, cv4),
-        SonicDistanceSensorHCSR04(cv2, cv5),
-        LightSensorGY302(cv3, cv6)
-        ];
-
     def __init__(self):
         super().__init__()
 
@@ -180,24 +86,206 @@ class SensitiveEuroPi(EuroPiScript):
 
         self.state = self.load_state_json()
         self.enabled = self.state.get("enabled", True)
+        self.display_fps = self.state.get("display_fps", DEFAULT_DISPLAY_FPS)
+        self.display_period_ms = 1000 // self.display_fps if self.display_fps else 0
+        self.redraw = True
+        self.state_changed = False
+        self.probe_index = 0
+        self.activating = None  # the sensor the recovery task re-initialises step by step
+        self.activation = None
+        self.activation_due = 0
+        # the hardware watchdog resets the module if the loop hangs anyway (0 leaves it off)
+        self.watchdog_ms = self.state.get("watchdog_ms", 0)
+        self.watchdog = None
+        # garbage collection only in idle windows, see memory.py
+        self.memory = MemoryManager()
 
         b1.handler(self.toggle_enablement)
 
-        self.i2c = I2C(id=I2C_ID, sda=Pin(I2C_SDA_PIN), scl=Pin(I2C_SCL_PIN))
+        self.i2c = I2C(id=I2C_ID, sda=Pin(I2C_SDA_PIN), scl=Pin(I2C_SCL_PIN), timeout=I2C_TIMEOUT_US)
+        # count the bus traffic per device and register (debug page and serial dump)
+        self.i2c_stats = None
+        if self.state.get("i2c_stats", False):
+            # the opt-in modules are only imported when they are used, to save RAM
+            from i2c_stats import InstrumentedI2C
+            self.i2c = self.i2c_stats = InstrumentedI2C(self.i2c)
+        self.create_sensors(self.state.get("sensors", DEFAULT_SENSORS))
+
+        # ticks_us deltas of the scheduler tasks and of the display and recovery phases
+        self.profiler = None
+        if self.state.get("profiler", False):
+            from profiler import Profiler
+            self.profiler = Profiler()
+            self.fill_stage = self.profiler.stage("fill")
+            self.text_stage = self.profiler.stage("text")
+            self.show_stage = self.profiler.stage("show")
+            self.recovery_stage = self.profiler.stage("init")
+
+        self.pages = [None]  # None is the page with the sensor readings
+        if self.i2c_stats:
+            self.pages.append(self.i2c_stats.lines)
+        if self.profiler:
+            self.pages.append(self.profiler.lines)
+        self.pages.append(self.memory.lines)
+        self.page = 0
+        self.page_drawn = ticks_ms()
+        b2.handler(self.next_page)
 
         self.init_sensors()
 
         for sensor in self.sensors:
             print(sensor)
 
+        # upsample the CV outputs between sensor readings (0 writes the readings directly)
+        self.output_engine = None
+        output_rate_hz = self.state.get("output_rate_hz", 0)
+        if output_rate_hz:
+            from output_engine import OutputEngine
+            self.output_engine = OutputEngine(output_rate_hz, self.state.get("output_mode", "linear"),
+                                              self.state.get("output_slew_ms", 20))
+            for sensor in self.sensors:
+                sensor.channel = self.output_engine.add(sensor.output)
+            self.output_engine.start()
+
+        self.create_scheduler()
+        self.memory.start()
+
+    def create_scheduler(self):
+        self.scheduler = Scheduler(self.profiler, self.memory)
+        self.add_acquisition_tasks(self.scheduler)
+        self.add_ui_tasks(self.scheduler)
+
+    def create_sensors(self, config):
+        """Create the configured sensors, skipping entries that don't make sense (with a warning)."""
+        self.mux = None
+        self.sensors = []
+        if not isinstance(config, list):
+            print("sensors must be a list, using the default sensors")
+            config = DEFAULT_SENSORS
+        used = []  # output and gate numbers
+        for entry in config:
+            index = len(self.sensors)
+            if index == len(cvs):
+                print(f"no outputs left, skipping {entry}")
+                continue
+            error = self.sensor_entry_error(entry, index, used)
+            if error:
+                print(f"skipping sensor {entry}: {error}")
+                continue
+            options = dict(entry)
+            sensor_type = options.pop("type")
+            output = options.pop("output", index + 1)
+            gate = options.pop("gate", None)
+            mux_channel = options.pop("mux_channel", None)
+            name = options.pop("name", None) or DRIVERS[sensor_type][2]
+            if any(sensor.name == name for sensor in self.sensors):
+                name = f"{name[:3]}{index + 1}"
+            try:
+                # the driver is only imported once the sensor is found, unless it needs options like an XSHUT pin
+                sensor = create_sensor(index, sensor_type, name, cvs[output - 1], cvs[gate - 1] if gate else None,
+                                       **options)
+            except Exception as e:  # e.g. an option the driver doesn't know
+                print(f"skipping sensor {entry}: {e!r}")
+                continue
+            used.append(output)
+            if gate:
+                used.append(gate)
+            sensor.bus = self.i2c
+            if mux_channel is not None:
+                if self.mux is None:
+                    from tca9548a import TCA9548A, TCA9548A_ADDRESS
+                    self.mux = TCA9548A(self.i2c, self.state.get("mux_address", TCA9548A_ADDRESS))
+                sensor.mux_channel = mux_channel
+                sensor.bus = self.mux.channel(mux_channel)
+            self.sensors.append(sensor)
+        if not self.sensors and config is not DEFAULT_SENSORS:
+            print("no usable sensors, using the default sensors")
+            self.create_sensors(DEFAULT_SENSORS)
+            return
+        for sensor in self.sensors:
+            sensor.place(sensor.index, len(self.sensors))
+
+    def sensor_entry_error(self, entry, index, used):
+        """What is wrong with an entry of the sensors list, None if nothing."""
+        if not isinstance(entry, dict):
+            return "not an object"
+        if entry.get("type") not in DRIVERS:
+            return f"unknown type {entry.get('type')!r}"
+        numbers = [entry.get("output", index + 1)]
+        if entry.get("gate"):
+            numbers.append(entry["gate"])
+        for number in numbers:
+            if not isinstance(number, int) or not 1 <= number <= len(cvs):
+                return f"there is no output {number!r}"
+            if number in used or numbers.count(number) > 1:
+                return f"output {number} is already used"
+        mux_channel = entry.get("mux_channel")
+        if mux_channel is not None:
+            from tca9548a import CHANNELS
+            if not isinstance(mux_channel, int) or not 0 <= mux_channel < CHANNELS:
+                return f"there is no multiplexer channel {mux_channel!r}"
+        return None
+
+    def add_acquisition_tasks(self, scheduler):
+        """The tasks that use the I2C bus."""
+        for index, sensor in enumerate(self.sensors):
+            # by index, a pending sensor is replaced once its driver is loaded
+            # the sensors of a multiplexer channel are polled together where possible
+            sensor.task = scheduler.add(sensor.name, lambda index=index: self.update_sensor(self.sensors[index]),
+                                        sensor.period_ms, sensor.budget_us, sensor.mux_channel)
+        scheduler.add("recovery", self.recover_sensors, RECOVERY_PERIOD_MS, RECOVERY_BUDGET_US)
+        if self.watchdog_ms:
+            scheduler.add("watchdog", self.feed_watchdog, WATCHDOG_FEED_PERIOD_MS, WATCHDOG_FEED_BUDGET_US)
+        if self.i2c_stats:
+            scheduler.add("i2c_dump", self.i2c_stats.dump, I2C_DUMP_PERIOD_MS, I2C_DUMP_BUDGET_US)
+
+    def add_ui_tasks(self, scheduler):
+        if self.display_period_ms:
+            scheduler.add("display", self.update_display, self.display_period_ms, DISPLAY_BUDGET_US)
+        scheduler.add("save", self.save_changed_state, SAVE_PERIOD_MS, SAVE_BUDGET_US)
+        scheduler.add("memory", self.check_memory, MEMORY_PERIOD_MS, MEMORY_BUDGET_US)
+        if self.profiler:
+            scheduler.add("profile_dump", self.profiler.dump, PROFILE_DUMP_PERIOD_MS, PROFILE_DUMP_BUDGET_US)
+
     def init_sensors(self):
+        now = ticks_ms()
+        found = self.i2c.scan()
+        print(found)
         for sensor in self.sensors:
-            sensor.reset()
-        i2c_addresses = self.i2c.scan()
-        print(i2c_addresses)
+            sensor.reset()  # e.g. holds the VL53L0X with XSHUT in reset, before any of them is probed
         for sensor in self.sensors:
-            if sensor.i2c_address in i2c_addresses:
-                sensor.activate(self.i2c, self.state)
+            sensor.retry_at = now  # the ones not found are probed by the recovery task
+            if sensor.bus is self.i2c and isinstance(sensor, PendingSensor) and sensor.i2c_address not in found:
+                continue  # not worth probing, let alone loading the driver
+            if sensor.probe(sensor.bus):
+                self.activate_sensor(self.load_sensor(sensor))
+
+    def load_sensor(self, sensor):
+        """The sensor with its driver, loaded if it is still pending."""
+        if isinstance(sensor, PendingSensor):
+            with self.memory:
+                sensor = sensor.load()
+            self.sensors[sensor.index] = sensor
+        return sensor
+
+    def activate_sensor(self, sensor):
+        sensor.activated_at = ticks_ms()
+        with self.memory:
+            try:
+                sensor.activate(sensor.bus, self.state)
+            except Exception as e:
+                self.fail_sensor(sensor, e)
+                return
+        self.take_state_change(sensor)
+
+    def take_state_change(self, sensor):
+        if sensor.state_changed:
+            sensor.state_changed = False
+            self.state_changed = True
+
+    def fail_sensor(self, sensor, e):
+        backoff = sensor.fail(ticks_ms())
+        print(f"{sensor.name} failed ({e!r}), retry in {backoff} ms")
 
     @classmethod
     def display_name(cls):
@@ -205,6 +293,16 @@ class SensitiveEuroPi(EuroPiScript):
 
     def toggle_enablement(self):
             self.enabled = not self.enabled
+            self.state_changed = True
+            self.redraw = True
+
+    def next_page(self):
+        self.page = (self.page + 1) % len(self.pages)
+        self.redraw = True
+
+    def save_changed_state(self):
+        if self.state_changed:
+            self.state_changed = False
             self.save_state()
 
     def save_state(self):
@@ -213,35 +311,148 @@ class SensitiveEuroPi(EuroPiScript):
 #         if self.last_saved() < 5000:
 #             return
  
-        self.state = {
-             "enabled": self.enabled
-            #  .... ADD SENSOR STATES
-        }
-        self.save_state_json(self.state)
-
-
-    def main(self):
-        oled.centre_text(f"Sensitive EuroPi\n{VERSION}")
-        sleep(1)
-        caught_exception = False
-        while True:
-            if caught_exception:
-                sleep(1)
-                self.init_sensors()
-                caught_exception = False
-            if self.enabled:
-                for sensor in self.sensors:
-                    try:
-                        sensor.update()
-                    except Exception:
-                        caught_exception = True
-                oled.fill(0)
-                for sensor in self.sensors:
-                    sensor.display_reading()
-                oled.show()
-            else:
+        # the sensors keep their settings in the state themselves
+        self.state["enabled"] = self.enabled
+        self.state["display_fps"] = self.display_fps
+        with self.memory:
+            self.save_state_json(self.state)
+
+
+    def check_memory(self):
+        self.memory.check()
+        if not self.display_period_ms:
+            self.memory.idle()  # no display pushes to wait for
+
+    def update_sensor(self, sensor):
+        if self.enabled and sensor.active:
+            reading = sensor.reading
+            sequence = reading.sequence
+            self.sample_sensor(sensor)
+            if reading.sequence != sequence:  # only write new readings
+                sensor.apply(reading.valid, reading.millivolts)
+
+    def sample_sensor(self, sensor):
+        """Sample a sensor, taking it out if it raises or blocks for longer than its watchdog budget.
+
+        Only this sensor is taken out, the others keep running. Its output holds the last
+        value and the gate drops.
+        """
+        start = ticks_us()
+        try:
+            sensor.sample()
+        except MemoryError:
+            self.memory.out_of_memory()  # not the sensor's fault
+            return
+        except Exception as e:
+            self.fail_sensor(sensor, e)
+            return
+        elapsed = ticks_diff(ticks_us(), start)
+        if elapsed > sensor.watchdog_us:
+            sensor.overruns += 1
+            if elapsed > sensor.overrun_us:
+                sensor.overrun_us = elapsed
+            self.fail_sensor(sensor, Overrun(elapsed))
+
+    def feed_watchdog(self):
+        if self.watchdog is None:
+            self.watchdog = WDT(timeout=self.watchdog_ms)  # armed once the loop runs, it can't be stopped
+        self.watchdog.feed()
+
+    def recover_sensors(self):
+        """Probe the next inactive sensor that is due and re-initialise it if it answers.
+
+        The re-initialisation runs one step per run, so that a sensor that has to be waited
+        for (e.g. a VL53L0X calibrating) doesn't hold up the others.
+        """
+        now = ticks_ms()
+        if self.activation is not None:
+            if ticks_diff(now, self.activation_due) >= 0:
+                self.continue_activation()
+            return
+        for _ in range(len(self.sensors)):
+            sensor = self.sensors[self.probe_index]
+            self.probe_index = (self.probe_index + 1) % len(self.sensors)
+            if not sensor.active and ticks_diff(now, sensor.retry_at) >= 0:
+                break
+        else:
+            return
+        if not sensor.probe(sensor.bus):
+            return
+        sensor = self.load_sensor(sensor)
+        sensor.activated_at = now
+        self.activating = sensor
+        self.activation = sensor.activation(sensor.bus, self.state)
+        self.continue_activation()
+
+    def continue_activation(self):
+        """Run the next step of the sensor the recovery task re-initialises."""
+        sensor = self.activating
+        start = ticks_us()
+        with self.memory:
+            try:
+                self.activation_due = ticks_add(ticks_ms(), next(self.activation))
+                return
+            except StopIteration:
+                print(sensor)
+            except Exception as e:
+                self.fail_sensor(sensor, e)
+            finally:
+                if self.profiler:
+                    self.profiler.record(self.recovery_stage, ticks_diff(ticks_us(), start))
+        self.activating = self.activation = None
+        self.take_state_change(sensor)
+
+    def update_display(self):
+        if not self.enabled:
+            if self.redraw:
+                self.redraw = False
                 oled.centre_text(f"Sensitive EuroPi\n{VERSION}\nPAUSED")
-                sleep(0.25)
+            self.memory.idle()
+            return
+        if self.pages[self.page]:
+            self.update_debug_page(self.pages[self.page])
+            return
+        profiler = self.profiler
+        redraw = self.redraw
+        if redraw:
+            self.redraw = False
+            start = ticks_us()
+            oled.fill(0)
+            if profiler:
+                profiler.record(self.fill_stage, ticks_diff(ticks_us(), start))
+        # only redraw the columns whose readings changed and skip the push if nothing did
+        changed = redraw
+        start = ticks_us()
+        for sensor in self.sensors:
+            if redraw or sensor.display_changed():
+                sensor.display_reading()
+                changed = True
+        if changed:
+            if profiler:
+                profiler.record(self.text_stage, ticks_diff(ticks_us(), start))
+                start = ticks_us()
+            oled.show()
+            if profiler:
+                profiler.record(self.show_stage, ticks_diff(ticks_us(), start))
+            self.memory.idle()  # the next frame is a while away
+
+    def update_debug_page(self, lines):
+        now = ticks_ms()
+        if not self.redraw and ticks_diff(now, self.page_drawn) < DEBUG_PAGE_PERIOD_MS:
+            return
+        self.redraw = False
+        self.page_drawn = now
+        oled.fill(0)
+        for row, line in enumerate(lines()[:OLED_HEIGHT // CHAR_HEIGHT]):
+            oled.text(line, 0, row * CHAR_HEIGHT, 1)
+        oled.show()
+        self.memory.idle()
+
+    def main(self, passes=None):
+        """Run forever, or for the given number of task runs (e.g. for benchmarks)."""
+        oled.centre_text(f"Sensitive EuroPi\n{VERSION}")
+        sleep_ms(SPLASH_MS)
+        self.scheduler.run(passes)
 
 
 # Main script execution
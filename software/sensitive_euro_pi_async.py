@@ -0,0 +1,138 @@
+"""
+Sensitive EuroPi (async) - generating CV from sensor reading with uasyncio
+author: Thomas Herrmann (github.com/thoherr)
+date: 2023-01-29
+labels: sensor
+
+Alternative entry point for Sensitive EuroPi with the same controls and outputs.
+Every sensor is acquired by its own coroutine, the OLED renderer and the b1
+handling are separate tasks. Waiting for a sensor conversion yields to the other
+tasks instead of blocking them: a coroutine sleeps until its sensor's result is
+due, or for a VL53L0X with a GPIO1 line, awaits a flag set by the data ready
+interrupt. The cooperative scheduler of the other runtimes isn't used.
+
+Falls back to CPython's asyncio, so it can run against the simulation package.
+"""
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+from europi import oled, b1
+from sensitive_euro_pi import SensitiveEuroPi, VERSION, SPLASH_MS, SAVE_PERIOD_MS, RECOVERY_PERIOD_MS, \
+    I2C_DUMP_PERIOD_MS, PROFILE_DUMP_PERIOD_MS, MEMORY_PERIOD_MS, WATCHDOG_FEED_PERIOD_MS
+
+BUTTON_POLL_MS = 20
+IDLE_POLL_MS = 20  # while a sensor is inactive or the readings are paused
+
+try:
+    ThreadSafeFlag = asyncio.ThreadSafeFlag
+except AttributeError:
+    class ThreadSafeFlag(asyncio.Event):
+        """CPython stand-in, the simulated interrupts run on the event loop's thread."""
+
+        async def wait(self):
+            await super().wait()
+            self.clear()
+
+try:
+    # integer ms, no float per wait
+    sleep_ms = asyncio.sleep_ms
+    wait_for_ms = asyncio.wait_for_ms
+except AttributeError:
+    def sleep_ms(ms):
+        return asyncio.sleep(ms / 1000)
+
+    def wait_for_ms(awaitable, timeout_ms):
+        return asyncio.wait_for(awaitable, timeout_ms / 1000)
+
+
+class AsyncSensitiveEuroPi(SensitiveEuroPi):
+
+    def __init__(self):
+        super().__init__()
+        self.button_pressed = False
+        # the handler only records the press, the button task does the work outside of the IRQ
+        b1.handler(self.press_button)
+
+    @classmethod
+    def display_name(cls):
+        return "Sensitive EuroPi async"
+
+    def create_scheduler(self):
+        self.scheduler = None  # the coroutines take the place of its tasks
+
+    def press_button(self):
+        self.button_pressed = True
+
+    async def acquire(self, index):
+        flag = self.sensors[index].ready_flag
+        while True:
+            # by index, a pending sensor is replaced once its driver is loaded
+            sensor = self.sensors[index]
+            try:
+                self.update_sensor(sensor)
+            except MemoryError:
+                self.memory.out_of_memory()
+            if not (self.enabled and sensor.active):
+                await sleep_ms(IDLE_POLL_MS)
+            elif sensor.signals_ready():
+                try:
+                    await wait_for_ms(flag.wait(), sensor.ready_in_ms())
+                except asyncio.TimeoutError:
+                    pass  # update_sensor() tells a late result from a hung sensor
+            else:
+                await sleep_ms(sensor.ready_in_ms())
+
+    async def render(self):
+        while True:
+            try:
+                self.update_display()
+            except MemoryError:
+                self.memory.out_of_memory()
+            await sleep_ms(self.display_period_ms)
+
+    async def handle_button(self):
+        while True:
+            if self.button_pressed:
+                self.button_pressed = False
+                self.toggle_enablement()
+            await sleep_ms(BUTTON_POLL_MS)
+
+    async def every(self, period_ms, function):
+        while True:
+            await sleep_ms(period_ms)
+            try:
+                function()
+            except MemoryError:
+                self.memory.out_of_memory()
+
+    async def run(self):
+        await sleep_ms(SPLASH_MS)
+        for sensor in self.sensors:
+            sensor.set_ready_flag(ThreadSafeFlag())
+        tasks = [asyncio.create_task(self.acquire(index)) for index in range(len(self.sensors))]
+        if self.display_period_ms:
+            tasks.append(asyncio.create_task(self.render()))
+        tasks.append(asyncio.create_task(self.handle_button()))
+        tasks.append(asyncio.create_task(self.every(SAVE_PERIOD_MS, self.save_changed_state)))
+        tasks.append(asyncio.create_task(self.every(RECOVERY_PERIOD_MS, self.recover_sensors)))
+        tasks.append(asyncio.create_task(self.every(MEMORY_PERIOD_MS, self.check_memory)))
+        if self.watchdog_ms:
+            tasks.append(asyncio.create_task(self.every(WATCHDOG_FEED_PERIOD_MS, self.feed_watchdog)))
+        if self.i2c_stats:
+            tasks.append(asyncio.create_task(self.every(I2C_DUMP_PERIOD_MS, self.i2c_stats.dump)))
+        if self.profiler:
+            tasks.append(asyncio.create_task(self.every(PROFILE_DUMP_PERIOD_MS, self.profiler.dump)))
+        await asyncio.gather(*tasks)
+
+    def main(self):
+        oled.centre_text(f"Sensitive EuroPi\n{VERSION}")
+        asyncio.run(self.run())
+
+
+# Main script execution
+if __name__ == '__main__':
+    script = AsyncSensitiveEuroPi()
+    script.main()
@@ -0,0 +1,147 @@
+"""
+Sensitive EuroPi (dual core) - generating CV from sensor reading on both RP2040 cores
+author: Thomas Herrmann (github.com/thoherr)
+date: 2023-01-29
+labels: sensor
+
+Alternative entry point for Sensitive EuroPi with the same controls and outputs.
+The second core runs the I2C acquisition (sensor polling and recovery) and hands
+every new reading to the first core through a slot per sensor. The first core
+writes the outputs and does the display, the button and saving the state, so a
+slow OLED push or JSON save doesn't delay the sensors. Writing the flash still
+pauses the second core briefly, as it runs from flash as well. A sensor that is
+re-initialised on the second core writes its settings (e.g. a new calibration)
+into the state the first core saves, so both hold the state lock for that.
+
+Runs on CPython's _thread as well, e.g. against the simulation package with a
+realtime clock.
+"""
+
+import _thread
+from array import array
+
+from europi import oled
+from scheduler import Scheduler
+from sensitive_euro_pi import SensitiveEuroPi, VERSION, SPLASH_MS, RECOVERY_PERIOD_MS, RECOVERY_BUDGET_US, \
+    I2C_DUMP_PERIOD_MS, I2C_DUMP_BUDGET_US, WATCHDOG_FEED_PERIOD_MS, WATCHDOG_FEED_BUDGET_US
+from utime import sleep_ms
+
+OUTPUT_PERIOD_MS = 1
+OUTPUT_BUDGET_US = 1000
+SEQUENCE_MASK = 0x3fffffff  # stay within small ints
+
+
+class Slot:
+    """Latest reading of a sensor, written by one core and read by the other.
+
+    The writer fills the buffer that isn't published and then bumps the sequence,
+    the reader retries if anything was published while it copied. One more write
+    would already go to the buffer it copies from, and that write may be half done
+    when the sequence is checked. Neither side locks or allocates.
+    """
+
+    def __init__(self):
+        self.sequence = 0
+        self.buffers = array('i', [0] * 4)  # valid, millivolts of two readings
+        # reader side copy of the last read
+        self.valid = False
+        self.millivolts = 0
+
+    def write(self, valid, millivolts):
+        sequence = (self.sequence + 1) & SEQUENCE_MASK
+        index = (sequence & 1) << 1
+        self.buffers[index] = 1 if valid else 0
+        self.buffers[index + 1] = millivolts
+        self.sequence = sequence
+
+    def read(self):
+        """Copy the published reading to valid and millivolts and return its sequence."""
+        while True:
+            sequence = self.sequence
+            index = (sequence & 1) << 1
+            valid = self.buffers[index]
+            millivolts = self.buffers[index + 1]
+            if self.sequence == sequence:
+                self.valid = valid != 0
+                self.millivolts = millivolts
+                return sequence
+
+
+class DualCoreSensitiveEuroPi(SensitiveEuroPi):
+
+    def __init__(self):
+        self.running = False
+        self.state_lock = _thread.allocate_lock()
+        super().__init__()
+
+    @classmethod
+    def display_name(cls):
+        return "Sensitive EuroPi dual core"
+
+    def add_acquisition_tasks(self, scheduler):
+        # the acquisition runs on its own scheduler on core 1, core 0 just writes what comes in
+        self.slots = [Slot() for sensor in self.sensors]
+        self.applied = [0] * len(self.sensors)
+        self.acquisition = Scheduler(memory=self.memory)
+        for index, sensor in enumerate(self.sensors):
+            sensor.task = self.acquisition.add(sensor.name, lambda index=index: self.acquire(index),
+                                               sensor.period_ms, sensor.budget_us, sensor.mux_channel)
+        self.acquisition.add("recovery", self.recover_sensors, RECOVERY_PERIOD_MS, RECOVERY_BUDGET_US)
+        if self.watchdog_ms:
+            # fed from the core with the I2C bus, which is where a hang would come from
+            self.acquisition.add("watchdog", self.feed_watchdog, WATCHDOG_FEED_PERIOD_MS, WATCHDOG_FEED_BUDGET_US)
+        if self.i2c_stats:
+            self.acquisition.add("i2c_dump", self.i2c_stats.dump, I2C_DUMP_PERIOD_MS, I2C_DUMP_BUDGET_US)
+        scheduler.add("outputs", self.apply_readings, OUTPUT_PERIOD_MS, OUTPUT_BUDGET_US)
+
+    def activate_sensor(self, sensor):
+        with self.state_lock:
+            super().activate_sensor(sensor)
+
+    def continue_activation(self):
+        with self.state_lock:
+            super().continue_activation()
+
+    def save_state(self):
+        with self.state_lock:
+            super().save_state()
+
+    def acquire(self, index):
+        sensor = self.sensors[index]  # by index, a pending sensor is replaced once its driver is loaded
+        if self.enabled and sensor.active:
+            reading = sensor.reading
+            sequence = reading.sequence
+            self.sample_sensor(sensor)  # a failing sensor publishes an invalid reading
+            if reading.sequence != sequence:
+                self.slots[index].write(reading.valid, reading.millivolts)
+
+    def apply_readings(self):
+        for index in range(len(self.sensors)):
+            slot = self.slots[index]
+            if slot.sequence != self.applied[index]:
+                self.applied[index] = slot.read()
+                if self.enabled:
+                    self.sensors[index].apply(slot.valid, slot.millivolts)
+
+    def run_acquisition(self):
+        try:
+            while self.running:
+                self.acquisition.run_once()
+        finally:
+            self.running = False
+
+    def main(self, passes=None):
+        oled.centre_text(f"Sensitive EuroPi\n{VERSION}")
+        sleep_ms(SPLASH_MS)
+        self.running = True
+        _thread.start_new_thread(self.run_acquisition, ())
+        try:
+            self.scheduler.run(passes)
+        finally:
+            self.running = False
+
+
+# Main script execution
+if __name__ == '__main__':
+    script = DualCoreSensitiveEuroPi()
+    script.main()
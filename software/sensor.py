@@ -0,0 +1,191 @@
+"""
+Sensor base class for Sensitive EuroPi
+
+A Sensor owns the CV and gate output of a sensor, its column on the display, its
+latest reading and its health (failures and backoff). The drivers for the
+different devices are subclasses in their own modules, loaded on demand through
+sensor_registry.
+"""
+
+from europi import oled, OLED_WIDTH, OLED_HEIGHT, CHAR_WIDTH
+from utime import ticks_add, ticks_diff
+
+BACKOFF_MIN_MS = 250  # until a failed sensor is probed again, doubled with every failure in a row
+BACKOFF_MAX_MS = 8000  # also the time a sensor has to run to clear its failures
+COLUMNS = 3  # more sensors are shown in two rows without labels
+DIGITS = tuple("0123456789")  # drawn one by one, so that the display doesn't need new strings
+
+
+def answers(bus, address):
+    """Whether a device ACKs the address, with an empty write."""
+    try:
+        bus.writeto(address, b"")
+    except OSError:
+        return False
+    return True
+
+
+class SensorReading:
+    """The latest reading of a sensor, updated in place so that sampling doesn't allocate."""
+
+    def __init__(self):
+        self.valid = False
+        self.millivolts = 0
+        self.sequence = 0  # counts the readings, to tell new ones
+
+    def set(self, valid, millivolts):
+        self.valid = valid
+        self.millivolts = millivolts
+        self.sequence = (self.sequence + 1) & 0x3fffffff  # stay within small ints
+
+
+class Sensor:
+    """A sensor with its outputs, display column and health."""
+    active = False
+    period_ms = 100
+    budget_us = 2000
+    watchdog_us = 10000  # a sample that blocks the loop longer is a fault
+    overruns = 0
+    overrun_us = 0  # the longest one
+    displayed_active = None
+    displayed_millivolts = None
+    state_changed = False  # settings were updated by the sensor, e.g. a new calibration
+    task = None  # the scheduler task polling the sensor
+    channel = None  # the output engine's channel, if the output is upsampled
+    bus = None  # the I2C bus or multiplexer channel the sensor is on
+    mux_channel = None
+    failures = 0  # in a row, for the backoff
+    retry_at = 0  # ticks_ms when an inactive sensor may be probed again
+    activated_at = 0
+    ready_flag = None  # set by an async runtime, for sensors that signal a new result
+
+    def __init__(self, index, name, description, i2c_address, output, gate=None):
+        self.index = index
+        self.name = name
+        self.description = description
+        self.i2c_address = i2c_address
+        self.label = f"{self.name:>4}"
+        self.reading = SensorReading()
+        self.output = output
+        self.output.voltage(0)
+        self.gate = gate  # None if the sensor has no gate output
+        if gate is not None:
+            gate.off()
+        self.place(index, 1)
+
+    def __str__(self):
+        status = f"@ 0x{self.i2c_address:x}" if self.active else "not connected"
+        if self.mux_channel is not None:
+            status += f" on channel {self.mux_channel}"
+        return f"{self.name} ({self.description}) {status}"
+
+    def place(self, cell, count):
+        """Set the display cell of the sensor when count sensors are shown."""
+        columns = COLUMNS if count <= COLUMNS else (count + 1) // 2
+        self.width = (OLED_WIDTH - 8) // columns
+        self.x = cell % columns * self.width + 4
+        self.y = cell // columns * (OLED_HEIGHT // 2)
+        self.compact = count > COLUMNS
+
+    def probe(self, bus):
+        """Whether the sensor is connected (a cheap check before activating it)."""
+        return answers(bus, self.i2c_address)
+
+    def reset(self):
+        self.i2c = None
+        self.state = None
+        self.active = False
+
+    def activate(self, i2c, state):
+        self.i2c = i2c
+        self.state = state
+        self.active = True
+
+    def activation(self, i2c, state):
+        """activate() in steps for the recovery task, yielding the ms to wait before the next one.
+
+        Sensors that have to wait for the device while they start up override this,
+        so that re-initialising one doesn't hold up the others.
+        """
+        self.activate(i2c, state)
+        yield from ()
+
+    def fail(self, now):
+        """Take the sensor out after an error, return the time until it is probed again."""
+        if self.active and ticks_diff(now, self.activated_at) > BACKOFF_MAX_MS:
+            self.failures = 0  # it ran fine for a while
+        self.failures += 1
+        backoff = min(BACKOFF_MIN_MS << min(self.failures - 1, 8), BACKOFF_MAX_MS)
+        self.retry_at = ticks_add(now, backoff)
+        self.reset()
+        self.reading.set(False, self.reading.millivolts)  # holds the CV, drops the gate
+        return backoff
+
+    def set_period(self, period_ms):
+        # the polling period may depend on the sensor's mode
+        self.period_ms = period_ms
+        if self.task is not None:
+            self.task.period_ms = period_ms
+
+    def settings(self, state):
+        """The part of the script state that belongs to this sensor."""
+        return state.setdefault(self.name, {})
+
+    def display_changed(self):
+        return self.active != self.displayed_active or self.reading.millivolts != self.displayed_millivolts
+
+    def display_reading(self):
+        millivolts = self.reading.millivolts
+        self.displayed_active = self.active
+        self.displayed_millivolts = millivolts
+        padding_x = self.x
+        padding_y = self.y
+        if self.compact:
+            # value and bar only, two rows of sensors
+            oled.fill_rect(padding_x, padding_y, self.width, OLED_HEIGHT // 2, 0)
+        else:
+            oled.fill_rect(padding_x, 0, self.width, OLED_HEIGHT, 0)
+            oled.text(self.label, padding_x, padding_y, 1)
+            padding_y = 12
+        if self.active:
+            self.display_value(millivolts, padding_x, padding_y)
+        else:
+            oled.text("  -  ", padding_x, padding_y, 1)
+        padding_y += 10 if self.compact else 12
+        oled.fill_rect(padding_x, padding_y, millivolts * self.width // 10000, 4, 1)
+
+    def display_value(self, millivolts, x, y):
+        # the value in volts with two decimals, as f"{volts:.2f}" would give
+        centivolts = (millivolts + 5) // 10
+        volts = centivolts // 100
+        if volts >= 10:
+            oled.text(DIGITS[volts // 10 % 10], x, y, 1)
+            x += CHAR_WIDTH
+        oled.text(DIGITS[volts % 10], x, y, 1)
+        oled.text(".", x + CHAR_WIDTH, y, 1)
+        oled.text(DIGITS[centivolts // 10 % 10], x + 2 * CHAR_WIDTH, y, 1)
+        oled.text(DIGITS[centivolts % 10], x + 3 * CHAR_WIDTH, y, 1)
+
+    def sample(self):
+        """Update the reading if the sensor has a new result."""
+        pass
+
+    def ready_in_ms(self):
+        """How long until sample() may find a new result, for runtimes that wait instead of polling."""
+        return self.period_ms
+
+    def signals_ready(self):
+        """Whether the sensor sets ready_flag when a result is ready (ready_in_ms() is then a timeout)."""
+        return False
+
+    def set_ready_flag(self, flag):
+        self.ready_flag = flag
+
+    def apply(self, valid, millivolts):
+        if valid:
+            if self.channel is not None:
+                self.channel.set(millivolts)
+            else:
+                self.output.voltage(millivolts / 1000)
+        if self.gate is not None:
+            self.gate.value(valid)
@@ -0,0 +1,133 @@
+"""
+GY302 (BH1750) brightness sensor for Sensitive EuroPi
+
+The brightness is mapped logarithmically, ln(1 + lx), to about 0 to 11 V, with
+auto ranging of the measurement time.
+"""
+
+from math import log
+from array import array
+from sensor import Sensor
+
+# 1000 * ln(1 + i / 128), for logarithms in integer arithmetic
+LOG_TABLE = array('H', [round(1000 * log(1 + i / 128)) for i in range(128)])
+LN2_UV = 693147
+
+
+def log_mv(x):
+    """1000 * ln(x) for an integer x >= 1, without floats."""
+    shift = 0
+    while x >= 256:
+        x >>= 1
+        shift += 1
+    while x < 128:
+        x <<= 1
+        shift -= 1
+    return LOG_TABLE[x - 128] + (shift + 7) * LN2_UV // 1000
+
+
+LOG_256_MV = log_mv(256)
+
+
+class LightSensorGY302(Sensor):
+    MEASUREMENT_DURATION = 120
+    POWER_DOWN = 0x00
+    CONTINUOUS_LOW_RES_MODE = 0x13
+    CONTINUOUS_HIGH_RES_MODE_1 = 0x10
+    CONTINUOUS_HIGH_RES_MODE_2 = 0x11
+    ONE_TIME_HIGH_RES_MODE_1 = 0x20
+    ONE_TIME_HIGH_RES_MODE_2 = 0x21
+    ONE_TIME_LOW_RES_MODE = 0x23
+    MTREG_HIGH_BITS = 0x40
+    MTREG_LOW_BITS = 0x60
+    MTREG_MIN = 31
+    MTREG_DEFAULT = 69
+    MTREG_MAX = 254
+    SATURATED_COUNTS = 60000  # shorten the integration time above
+    DIM_COUNTS = 200  # lengthen the integration time below
+    BRIGHT_COUNTS = 1000  # back down towards the configured time above, well clear of DIM_COUNTS after halving
+    UNSATURATED_COUNTS = 16384  # back up towards the configured time below, well clear of SATURATED_COUNTS
+    MAX_MEASUREMENT_DURATION = 180
+    # command, measurement duration (ms), continuous, counts per lx (all at the default MTreg)
+    # One time modes wait for the maximum duration, as reading restarts the measurement.
+    # Continuous modes poll at the typical duration, an early read just returns the last result.
+    MODES = {
+        "one_time_high_res": (ONE_TIME_HIGH_RES_MODE_1, MAX_MEASUREMENT_DURATION, False, 1.2),
+        "one_time_high_res_2": (ONE_TIME_HIGH_RES_MODE_2, MAX_MEASUREMENT_DURATION, False, 2.4),
+        "one_time_low_res": (ONE_TIME_LOW_RES_MODE, 24, False, 1.2),
+        "continuous_high_res": (CONTINUOUS_HIGH_RES_MODE_1, MEASUREMENT_DURATION, True, 1.2),
+        "continuous_high_res_2": (CONTINUOUS_HIGH_RES_MODE_2, MEASUREMENT_DURATION, True, 2.4),
+        "continuous_low_res": (CONTINUOUS_LOW_RES_MODE, 16, True, 1.2),  # for fast light gestures
+    }
+
+    period_ms = MEASUREMENT_DURATION
+    continuous = False
+
+    def __init__(self, index, name, description, i2c_address, output, gate=None):
+        super().__init__(index, name, description, i2c_address, output, gate)
+        self.data = bytearray(2)
+        self.command = bytearray(1)
+        self.mtreg_command = bytearray(1)
+
+    def activate(self, i2c, state):
+        settings = self.settings(state)
+        self.mode = settings.setdefault("mode", "one_time_high_res")  # TODO: This should be configurable by UI
+        self.command[0], self.duration, self.continuous, self.counts_per_lux = \
+            self.MODES.get(self.mode, self.MODES["one_time_high_res"])
+        # the measurement time (MTreg) trades speed against sensitivity, auto ranging adapts it to the light
+        self.auto_range = settings.get("auto_range", True)
+        super().activate(i2c, state)
+        # auto ranging only lengthens the time beyond this while it is dim, so fast modes stay fast
+        self.base_mtreg = min(max(settings.get("mtreg", self.MTREG_DEFAULT), self.MTREG_MIN), self.MTREG_MAX)
+        self.set_mtreg(self.base_mtreg)
+
+    def set_mtreg(self, mtreg):
+        self.mtreg = min(max(mtreg, self.MTREG_MIN), self.MTREG_MAX)
+        self.mtreg_command[0] = self.MTREG_HIGH_BITS | self.mtreg >> 5
+        self.i2c.writeto(self.i2c_address, self.mtreg_command)
+        self.mtreg_command[0] = self.MTREG_LOW_BITS | self.mtreg & 0x1f
+        self.i2c.writeto(self.i2c_address, self.mtreg_command)
+        # restart the measurement with the new time, one time modes return its result with the next read
+        self.i2c.writeto(self.i2c_address, self.command)
+        self.set_period((self.duration * self.mtreg + self.MTREG_DEFAULT - 1) // self.MTREG_DEFAULT)
+        self.settling = True  # a continuous mode may still return a result of the old time
+        # lx per count in 1/256
+        self.scale = round(256 * self.MTREG_DEFAULT / (self.counts_per_lux * self.mtreg))
+
+    def reset(self):
+        if self.active and self.continuous:
+            try:
+                self.command[0] = self.POWER_DOWN
+                self.i2c.writeto(self.i2c_address, self.command)
+            except OSError:
+                pass  # the sensor may already be gone
+        super().reset()
+
+    def convert_to_number(self, data):
+        return data[1] + (256 * data[0])
+
+    def read_light(self):
+        if self.continuous:
+            # just fetch the latest result
+            self.i2c.readfrom_into(self.i2c_address, self.data)
+        else:
+            # returns the previous result and starts the next measurement
+            self.i2c.readfrom_mem_into(self.i2c_address, self.command[0], self.data)
+        counts = self.convert_to_number(self.data)
+        lux = counts * self.scale  # in 1/256 lx
+        if self.settling:
+            self.settling = False
+        elif self.auto_range:
+            if counts > self.SATURATED_COUNTS and self.mtreg > self.MTREG_MIN:
+                self.set_mtreg(self.mtreg // 2)
+            elif counts < self.DIM_COUNTS and self.mtreg < self.MTREG_MAX:
+                self.set_mtreg(self.mtreg * 2)
+            elif counts > self.BRIGHT_COUNTS and self.mtreg > self.base_mtreg:
+                self.set_mtreg(max(self.mtreg // 2, self.base_mtreg))
+            elif counts < self.UNSATURATED_COUNTS and self.mtreg < self.base_mtreg:
+                self.set_mtreg(min(self.mtreg * 2, self.base_mtreg))
+        return lux
+
+    def sample(self):
+        # ln(1 + lx) gives a scale from 0 to about 11 V
+        self.reading.set(True, log_mv(256 + self.read_light()) - LOG_256_MV)
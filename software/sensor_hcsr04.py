@@ -0,0 +1,58 @@
+"""
+HC-SR04 ultrasonic distance sensor (I2C version) for Sensitive EuroPi
+
+A measurement is started by writing 0x01 and its result, the distance in um as
+three big endian bytes, can be read once the echo is back and processed. The
+sensor doesn't block on the echo: sample() collects the result of the last
+trigger once it is due (by ticks_ms) and triggers the next measurement right
+away. The distance is mapped to the same scale as the VL53L0X.
+"""
+
+from sensor import Sensor
+from utime import ticks_diff, ticks_ms
+
+
+class SonicDistanceSensorHCSR04(Sensor):
+    TRIGGER = b"\x01"
+    ECHO_MS = 100  # the module needs 50 to 100 ms, depending on the distance
+    MIN_ECHO_MS = 50
+    MIN_RANGE_MM = 20  # closer echoes are not reliable
+    MAX_RANGE_MM = 4500  # no echo or a bad one comes back as 0 or beyond this
+    OFFSET_MM = 30
+    MAX_MM = 999
+    MAX_MILLIVOLTS = 9990
+    period_ms = 5  # just a ticks check while the measurement isn't due
+
+    def __init__(self, index, name, description, i2c_address, output, gate=None):
+        super().__init__(index, name, description, i2c_address, output, gate)
+        self.data = bytearray(3)
+        self.triggered_at = 0
+
+    def activate(self, i2c, state):
+        settings = self.settings(state)
+        # shorter waits give faster readings but may cut off the echoes of far objects
+        self.echo_ms = max(settings.get("echo_ms", self.ECHO_MS), self.MIN_ECHO_MS)
+        super().activate(i2c, state)
+        self.trigger()
+
+    def trigger(self):
+        self.i2c.writeto(self.i2c_address, self.TRIGGER)
+        self.triggered_at = ticks_ms()
+
+    def ready_in_ms(self):
+        return max(self.echo_ms - ticks_diff(ticks_ms(), self.triggered_at), 0)
+
+    def sample(self):
+        if ticks_diff(ticks_ms(), self.triggered_at) < self.echo_ms:
+            return  # still measuring, keep the last result
+        self.i2c.readfrom_into(self.i2c_address, self.data)
+        self.trigger()
+        distance = ((self.data[0] << 16) + (self.data[1] << 8) + self.data[2]) // 1000
+        if not self.MIN_RANGE_MM <= distance <= self.MAX_RANGE_MM:
+            self.reading.set(False, 0)  # no echo or a bad one
+            return
+        distance = min(max(distance - self.OFFSET_MM, 0), self.MAX_MM)
+        if distance < self.MAX_MM:
+            self.reading.set(True, distance * self.MAX_MILLIVOLTS // self.MAX_MM)
+        else:
+            self.reading.set(False, 0)
@@ -0,0 +1,82 @@
+"""
+Sensor driver registry for Sensitive EuroPi
+
+The registry knows the name, I2C address and a cheap probe of every sensor type
+without importing its driver. A configured sensor starts out as a PendingSensor,
+which has the outputs and the display column of the sensor but no driver. Only
+once its device answers the probe is the driver module imported and the real
+sensor created in its place, so the VL53L0X driver with its tables doesn't take
+up RAM if no VL53L0X is connected.
+
+New sensor types are added with register(), e.g. from a script that imports
+sensitive_euro_pi, without touching the core script.
+"""
+
+from sensor import Sensor, answers
+
+IDENTIFICATION_MODEL_ID = 0xC0  # VL53L0X
+VL53L0X_MODEL_ID = 0xEE
+
+
+def probe_vl53l0x(bus, address):
+    """The model ID, so that another device at 0x29 isn't taken for a VL53L0X."""
+    try:
+        return bus.readfrom_mem(address, IDENTIFICATION_MODEL_ID, 1)[0] == VL53L0X_MODEL_ID
+    except OSError:
+        return False
+
+
+# type: driver module, class, name, description, default address, probe(bus, address)
+DRIVERS = {
+    "vl53l0x": ("sensor_vl53l0x", "LaserDistanceSensorVL53L0X", "LToF", "Laser distance sensor VL53L0X",
+                0x29, probe_vl53l0x),  # after power up, can be changed to use several sensors on one bus
+    "hcsr04": ("sensor_hcsr04", "SonicDistanceSensorHCSR04", "SON", "Sonic distance sensor HC-SR04",
+               0x57, answers),
+    "gy302": ("sensor_gy302", "LightSensorGY302", "LUX", "Brightness sensor GY302 (BH1750)",
+              0x23, answers),  # 0x5c with ADDR high
+}
+
+
+def register(sensor_type, module, class_name, name, description, address, probe=answers):
+    DRIVERS[sensor_type] = (module, class_name, name, description, address, probe)
+
+
+def driver(sensor_type):
+    """The sensor class of a type, importing its module on first use."""
+    module, class_name = DRIVERS[sensor_type][:2]
+    return getattr(__import__(module), class_name)
+
+
+class PendingSensor(Sensor):
+    """A configured sensor whose driver isn't loaded yet, shown as not connected."""
+
+    def __init__(self, index, sensor_type, name, output, gate=None, address=None, **options):
+        _, _, default_name, description, default_address, self.probe_device = DRIVERS[sensor_type]
+        super().__init__(index, name or default_name, description,
+                         default_address if address is None else address, output, gate)
+        self.sensor_type = sensor_type
+        self.options = options  # passed on to the driver
+
+    def probe(self, bus):
+        return self.probe_device(bus, self.i2c_address)
+
+    def load(self):
+        """Create the real sensor, which takes over the outputs, place and health of this one."""
+        sensor = driver(self.sensor_type)(self.index, self.name, self.description, self.i2c_address,
+                                          self.output, self.gate, **self.options)
+        sensor.bus = self.bus
+        sensor.mux_channel = self.mux_channel
+        sensor.task = self.task
+        sensor.channel = self.channel
+        sensor.failures = self.failures
+        sensor.retry_at = self.retry_at
+        sensor.set_ready_flag(self.ready_flag)
+        sensor.width, sensor.x, sensor.y, sensor.compact = self.width, self.x, self.y, self.compact
+        sensor.set_period(sensor.period_ms)
+        return sensor
+
+
+def create_sensor(index, sensor_type, name, output, gate=None, address=None, **options):
+    """A pending sensor, or the real one right away if it has driver options (e.g. an XSHUT pin)."""
+    sensor = PendingSensor(index, sensor_type, name, output, gate, address, **options)
+    return sensor.load() if options else sensor
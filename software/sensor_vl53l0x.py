@@ -0,0 +1,164 @@
+"""
+VL53L0X laser time of flight distance sensor for Sensitive EuroPi
+
+The distance from 30 to about 1000 mm is mapped to 0 to 10 V. Several of them can
+share a bus with an XSHUT line each, which keeps a sensor in reset until it has
+got its own address.
+"""
+
+from machine import ADC, Pin
+from sensor import Sensor, answers
+from vl53l0x import VL53L0X, RANGE_STATUS_VALID
+from utime import sleep_ms
+
+
+class LaserDistanceSensorVL53L0X(Sensor):
+    ADDRESS = 0x29  # after power up, can be changed to use several sensors on one bus
+    BOOT_MS = 2
+    period_ms = 1  # just a status register read while no result is ready
+    vl53l0x = None
+    IO_TIMEOUT_MS = 100  # bounds the waits during init and for a late result
+    TEMPERATURE_ADC = 4  # the RP2040's own temperature sensor
+    CALIBRATION_DRIFT_C = 8  # calibrate again after a larger change in temperature, as ST recommends
+    OFFSET_MM = 30
+    MAX_MM = 999
+    MAX_MILLIVOLTS = 9990
+    pre_periods = [12, 14, 16, 18]
+    final_periods = [8, 10, 12, 14]
+    # timing budget (us), signal rate limit (MCPS), pre range and final range VCSEL period
+    PROFILES = {
+        "high_speed": (20000, 0.25, 14, 10),
+        "default": (33000, 0.1, 14, 10),
+        "high_accuracy": (200000, 0.25, 14, 10),
+        "long_range": (33000, 0.1, 18, 14),
+    }
+
+    def __init__(self, index, name, description, i2c_address, output, gate=None, xshut_pin=None):
+        super().__init__(index, name, description, i2c_address, output, gate)
+        # with several sensors on one bus, XSHUT keeps the others in reset while one gets its address
+        self.xshut = Pin(xshut_pin, Pin.OUT, value=0) if xshut_pin is not None else None
+
+    def probe(self, bus):
+        if self.xshut is not None and not self.xshut.value():
+            self.xshut.value(1)  # out of reset, it boots at the default address
+            sleep_ms(self.BOOT_MS)
+        if super().probe(bus):
+            return True
+        return self.i2c_address != self.ADDRESS and answers(bus, self.ADDRESS)
+
+    def activate(self, i2c, state):
+        for ms in self.activation(i2c, state):
+            sleep_ms(ms)
+
+    def activation(self, i2c, state):
+        settings = self.settings(state)
+        # trade latency against noise, e.g. high_speed for gestures and high_accuracy for slow modulation
+        self.profile = settings.setdefault("profile", "default")  # TODO: This should be configurable by UI
+        self.timing_budget_us, self.signal_rate_limit, pre_period, final_period = \
+            self.PROFILES.get(self.profile, self.PROFILES["default"])
+        # Pre: 12 to 18, Final: 8 to 14 (explicit settings override the profile)
+        self.pre_period = settings.get("pre_period", pre_period)
+        self.final_period = settings.get("final_period", final_period)
+        # Continuous (back-to-back) ranging instead of triggering every single measurement
+        self.continuous = settings.get("continuous", True)
+
+        # reuse the SPAD and reference calibration of the last start with the same VCSEL periods
+        temperature = self.temperature()
+        calibration = self.saved_calibration(settings, temperature)
+        # a sensor with its own address is back at the default one after a reset or power cycle
+        address = self.i2c_address
+        if address != self.ADDRESS and not answers(i2c, address):
+            address = self.ADDRESS
+        # a re-init after a fault reuses the driver, don't allocate a new one with all its buffers
+        if self.vl53l0x is None or self.vl53l0x.i2c is not i2c:
+            # optional GPIO1 data ready line, saves polling the status register over I2C
+            gpio1_pin = settings.get("gpio1_pin")
+            gpio1 = Pin(gpio1_pin, Pin.IN, Pin.PULL_UP) if gpio1_pin is not None else None
+            self.vl53l0x = VL53L0X(i2c, address=address, gpio1=gpio1, io_timeout_ms=self.IO_TIMEOUT_MS,
+                                   restart=False)
+        self.vl53l0x.address = address
+        try:
+            yield from self.vl53l0x.restart_steps(calibration)
+        except Exception:
+            if calibration is not None:
+                # don't let a bad cache fail every retry, the next one calibrates from scratch
+                settings.pop("calibration", None)
+                self.state_changed = True
+            raise
+        self.vl53l0x.ready_flag = self.ready_flag
+        if address != self.i2c_address:
+            self.vl53l0x.set_address(self.i2c_address)
+        yield 0
+        yield from self.config_steps()
+        if self.vl53l0x.calibrated:
+            # only a new calibration is saved, reusing one doesn't write the flash
+            calibration = self.vl53l0x.get_calibration()
+            calibration["temperature"] = temperature
+            settings["calibration"] = calibration
+            self.state_changed = True
+        if self.continuous:
+            self.vl53l0x.start()
+        else:
+            self.vl53l0x.trigger()
+        super().activate(i2c, state)
+
+    def temperature(self):
+        """The RP2040's temperature in °C, which follows the sensor's close enough for its calibration."""
+        volts = ADC(self.TEMPERATURE_ADC).read_u16() * 3.3 / 65535
+        return round(27 - (volts - 0.706) / 0.001721)
+
+    def saved_calibration(self, settings, temperature):
+        """The saved calibration, if it belongs to the VCSEL periods and about the temperature."""
+        calibration = settings.get("calibration")
+        try:
+            if calibration["vcsel_periods"] == [self.pre_period, self.final_period] \
+                    and abs(calibration["temperature"] - temperature) <= self.CALIBRATION_DRIFT_C:
+                return calibration
+        except (KeyError, TypeError):
+            pass  # none, malformed or from before the temperature was saved
+        return None
+
+    def reset(self):
+        if self.active and self.continuous:
+            try:
+                self.vl53l0x.stop()
+            except OSError:
+                pass  # the sensor may already be gone
+        if self.xshut is not None:
+            self.xshut.value(0)  # back to the default address, probe() brings it up again
+        super().reset()
+
+    def ready_in_ms(self):
+        return self.vl53l0x.ready_in_ms()
+
+    def signals_ready(self):
+        return self.vl53l0x.signals_ready()
+
+    def set_ready_flag(self, flag):
+        super().set_ready_flag(flag)
+        if self.vl53l0x is not None:
+            self.vl53l0x.ready_flag = flag
+
+    def sample(self):
+        if not self.vl53l0x.data_ready():
+            return  # keep the last result until the next one is finished
+        distance = self.vl53l0x.collect()
+        if not self.continuous:
+            self.vl53l0x.trigger()
+        if self.vl53l0x.range_status != RANGE_STATUS_VALID:
+            self.reading.set(False, 0)  # e.g. signal, sigma or phase check failed
+            return
+        distance = min(max(distance - self.OFFSET_MM, 0), self.MAX_MM)
+        if distance < self.MAX_MM:
+            self.reading.set(True, distance * self.MAX_MILLIVOLTS // self.MAX_MM)
+        else:
+            self.reading.set(False, 0)
+
+    def config_steps(self):
+        self.vl53l0x.set_signal_rate_limit(self.signal_rate_limit)
+        self.vl53l0x.set_Vcsel_pulse_period(self.vl53l0x.vcsel_period_type[0], self.pre_period, False)
+        self.vl53l0x.set_Vcsel_pulse_period(self.vl53l0x.vcsel_period_type[1], self.final_period, False)
+        if self.vl53l0x.calibrated:
+            # once for both periods, a restored calibration already belongs to them
+            yield from self.vl53l0x.phase_calibration_steps()
+        self.vl53l0x.set_measurement_timing_budget(self.timing_budget_us)
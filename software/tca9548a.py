@@ -0,0 +1,86 @@
+"""
+TCA9548A I2C multiplexer for Sensitive EuroPi
+
+The multiplexer connects the bus to one of its eight downstream channels, so that
+several sensors with the same address can be used at once. channel(n) returns a
+stand-in for machine.I2C that selects channel n before every transfer. Selecting
+the channel that is already connected doesn't touch the bus, so keeping the
+transfers of one channel together keeps the switches down (see the task groups
+of the scheduler).
+
+A device directly on the bus must not share its address with a device behind the
+selected channel.
+"""
+
+from micropython import const
+
+TCA9548A_ADDRESS = const(0x70)  # 0x70 to 0x77, set by A0 to A2
+CHANNELS = const(8)
+
+
+class TCA9548A:
+    def __init__(self, i2c, address=TCA9548A_ADDRESS):
+        self.i2c = i2c
+        self.address = address
+        self.selected = None  # unknown until the first switch
+        self.switches = 0
+        self._mask = bytearray(1)
+        self.channels = [MuxChannel(self, channel) for channel in range(CHANNELS)]
+
+    def channel(self, channel):
+        return self.channels[channel]
+
+    def select(self, channel):
+        if channel == self.selected:
+            return
+        self._mask[0] = 1 << channel
+        self.selected = None  # in case the write fails
+        self.i2c.writeto(self.address, self._mask)
+        self.selected = channel
+        self.switches += 1
+
+    def disable(self):
+        """Disconnect all channels."""
+        self._mask[0] = 0
+        self.selected = None
+        self.i2c.writeto(self.address, self._mask)
+
+
+class MuxChannel:
+    """The part of the machine.I2C interface the drivers use, on one channel of the multiplexer."""
+
+    def __init__(self, mux, channel):
+        self.mux = mux
+        self.channel = channel
+
+    def scan(self):
+        self.mux.select(self.channel)
+        return [address for address in self.mux.i2c.scan() if address != self.mux.address]
+
+    def readfrom_mem(self, addr, memaddr, nbytes, *, addrsize=8):
+        self.mux.select(self.channel)
+        return self.mux.i2c.readfrom_mem(addr, memaddr, nbytes, addrsize=addrsize)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, *, addrsize=8):
+        self.mux.select(self.channel)
+        return self.mux.i2c.readfrom_mem_into(addr, memaddr, buf, addrsize=addrsize)
+
+    def writeto_mem(self, addr, memaddr, buf, *, addrsize=8):
+        self.mux.select(self.channel)
+        return self.mux.i2c.writeto_mem(addr, memaddr, buf, addrsize=addrsize)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        self.mux.select(self.channel)
+        return self.mux.i2c.readfrom(addr, nbytes, stop)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        self.mux.select(self.channel)
+        return self.mux.i2c.readfrom_into(addr, buf, stop)
+
+    def writeto(self, addr, buf, stop=True):
+        self.mux.select(self.channel)
+        return self.mux.i2c.writeto(addr, buf, stop)
+
+    def writevto(self, addr, vector, stop=True):
+        self.mux.select(self.channel)
+        return self.mux.i2c.writevto(addr, vector, stop)
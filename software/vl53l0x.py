@@ -4,7 +4,7 @@ from micropython import const
 import ustruct
 import utime
 
-_IO_TIMEOUT = 1000
+_IO_TIMEOUT = 1000  # ms
 _SYSRANGE_START = const(0x00)
 _EXTSUP_HV = const(0x89)
 _MSRC_CONFIG = const(0x60)
@@ -21,6 +21,24 @@ _RESULT_INTERRUPT_STATUS = const(0x13)
 _RESULT_RANGE_STATUS = const(0x14)
 _OSC_CALIBRATE = const(0xf8)
 _MEASURE_PERIOD = const(0x04)
+_VHV_SETTINGS = const(0xcb)
+_PHASE_CAL = const(0xee)
+_BOOT_TIME_MS = const(2)
+_SYNC_US = const(2000)
+
+# device range status (bits 3 to 6 of RESULT_RANGE_STATUS) of a valid measurement
+RANGE_STATUS_VALID = const(11)
+
+# measurement timing budget overheads in us
+_START_OVERHEAD = const(1910)
+_SET_START_OVERHEAD = const(1320)  # the reference driver uses less when setting the budget
+_END_OVERHEAD = const(960)
+_MSRC_OVERHEAD = const(660)
+_TCC_OVERHEAD = const(590)
+_DSS_OVERHEAD = const(690)
+_PRE_RANGE_OVERHEAD = const(660)
+_FINAL_RANGE_OVERHEAD = const(550)
+_MIN_TIMING_BUDGET = const(20000)
 
 SYSRANGE_START = 0x00
 
@@ -110,14 +128,27 @@ class TimeoutError(RuntimeError):
 
 
 class VL53L0X():
-    def __init__(self, i2c, address=0x29):
+    def __init__(self, i2c, address=0x29, calibration=None, gpio1=None, io_timeout_ms=_IO_TIMEOUT,
+                 restart=True):
+        """gpio1 is an optional machine.Pin wired to the sensor's GPIO1 (data ready, active low).
+
+        io_timeout_ms bounds every wait for the sensor, during init and beyond the expected
+        end of a measurement. Without restart, the sensor is left to restart() or
+        restart_steps().
+        """
         self.i2c = i2c
         self.address = address
-        utime.sleep_ms(100) # give the I2C time to init
-        self.init()
-        self._started = False
-        self.measurement_timing_budget_us = 0
-        self.set_measurement_timing_budget(self.measurement_timing_budget_us)
+        self.io_timeout_ms = io_timeout_ms
+        # preallocated transfer buffers, so that register access doesn't allocate
+        self._byte = bytearray(1)
+        self._word = bytearray(2)
+        self._pair = bytearray(2)
+        self._result = bytearray(12)
+        # details of the last collected measurement
+        self.range_status = 0
+        self.effective_spad_count = 0  # 8.8 fixed point
+        self.signal_rate = 0  # MCPS, 9.7 fixed point
+        self.ambient_rate = 0  # MCPS, 9.7 fixed point
         self.enables = {"tcc": 0,
                         "dss": 0,
                         "msrc": 0,
@@ -133,6 +164,54 @@ class VL53L0X():
                          "final_range_us": 0
                          }
         self.vcsel_period_type = ["VcselPeriodPreRange", "VcselPeriodFinalRange"]
+        self._gpio1 = gpio1
+        self.ready_flag = None
+        if gpio1 is not None:
+            gpio1.irq(handler=self._interrupt, trigger=gpio1.IRQ_FALLING)
+        if restart:
+            self.restart(calibration)
+
+    def restart(self, calibration=None):
+        """(Re-)initialise the sensor, reusing this object and its buffers."""
+        for ms in self.restart_steps(calibration):
+            utime.sleep_ms(ms)
+
+    def restart_steps(self, calibration=None):
+        """restart() in steps, yielding the ms to wait before the next one instead of sleeping.
+
+        Runs the initialisation in the gaps of a loop, e.g. to re-initialise a sensor
+        without holding up the others on the bus.
+        """
+        if calibration is None:
+            yield 100 # give the I2C time to init
+        else:
+            yield _BOOT_TIME_MS
+        self._started = False
+        self._ready = False
+        yield from self.init_steps(calibration=calibration)
+        self._period = 0
+        self._deadline = 0
+        self._poll_after = 0
+        self._missed_at = 0
+        self.measurement_timing_budget_us = self.get_measurement_timing_budget()
+
+    def _interrupt(self, pin):
+        # runs in interrupt context, just remember that a result is waiting
+        self._ready = True
+        if self.ready_flag is not None:
+            self.ready_flag.set()  # e.g. a uasyncio ThreadSafeFlag, wakes the waiting task
+
+    def signals_ready(self):
+        """Whether results are signalled on GPIO1 (and ready_flag is set then)."""
+        return self._gpio1 is not None
+
+    def ready_in_ms(self):
+        """Time until data_ready() may find a result, with GPIO1 until it gives up on one."""
+        if self._gpio1 is not None:
+            wait = utime.ticks_diff(self._deadline, utime.ticks_ms())
+        else:
+            wait = utime.ticks_diff(self._poll_after, utime.ticks_us()) // 1000
+        return max(wait, 1)
 
     def ping(self):
         self.start()
@@ -140,6 +219,78 @@ class VL53L0X():
         self.stop()
         return distance
 
+    def trigger(self):
+        """Start a single measurement without waiting for its result."""
+        self._write_sequence(self._trigger_sequence)
+        self._expect_result()
+        self._arm_deadline()
+
+    def data_ready(self):
+        """Check whether a result can be collected.
+
+        With a GPIO1 pin this doesn't touch the bus, otherwise it takes a single
+        status read.
+        """
+        if self._gpio1 is not None:
+            # the level catches an edge that came before the handler was installed
+            if self._ready or not self._gpio1.value():
+                return True
+        elif utime.ticks_diff(utime.ticks_us(), self._poll_after) < 0:
+            return False  # the measurement can't be finished yet
+        elif self._register(_RESULT_INTERRUPT_STATUS) & 0x07:
+            return True
+        else:
+            self._missed_at = utime.ticks_us()
+        if utime.ticks_diff(utime.ticks_ms(), self._deadline) > 0:
+            raise TimeoutError()
+        return False
+
+    def collect(self):
+        """Fetch the finished result and acknowledge it.
+
+        The whole result block is read in one burst. Returns the distance in mm, the
+        other fields are kept in range_status, effective_spad_count, signal_rate
+        and ambient_rate.
+        """
+        result = self._result
+        self.i2c.readfrom_mem_into(self.address, _RESULT_RANGE_STATUS, result)
+        self.range_status = (result[0] & 0x78) >> 3
+        self.effective_spad_count = (result[2] << 8) | result[3]
+        self.signal_rate = (result[6] << 8) | result[7]
+        self.ambient_rate = (result[8] << 8) | result[9]
+        value = (result[10] << 8) | result[11]
+        self._ready = False  # before the clear, so that the next edge isn't lost
+        self._register(_INTERRUPT_CLEAR, 0x01)
+        self._arm_deadline()
+        if self._started:
+            if utime.ticks_diff(utime.ticks_us(), self._missed_at) < _SYNC_US:
+                self._expect_result()
+            else:
+                # the result came some time after the last poll that missed it, poll from the
+                # earliest time the next one can be there to get in phase again
+                budget = self.measurement_timing_budget_us
+                self._poll_after = utime.ticks_add(self._missed_at, budget - (budget >> 3))
+        return value
+
+    def _expect_result(self):
+        # don't poll the status before most of the timing budget has passed
+        budget = self.measurement_timing_budget_us
+        self._poll_after = utime.ticks_add(utime.ticks_us(), budget - (budget >> 3))
+        self._missed_at = self._poll_after  # known not to be ready until then
+
+    def _arm_deadline(self):
+        # data_ready() gives up on a result that is this late
+        timeout = self._period + self.measurement_timing_budget_us // 1000 + self.io_timeout_ms
+        self._deadline = utime.ticks_add(utime.ticks_ms(), timeout)
+
+    def _wait(self, ready):
+        # a step of init_steps(), ready is checked before the deadline as the steps may be far apart
+        deadline = utime.ticks_add(utime.ticks_ms(), self.io_timeout_ms)
+        while not ready():
+            if utime.ticks_diff(utime.ticks_ms(), deadline) > 0:
+                raise TimeoutError()
+            yield 1
+
     def _registers(self, register, values=None, struct='B'):
         if values is None:
             size = ustruct.calcsize(struct)
@@ -150,9 +301,25 @@ class VL53L0X():
         self.i2c.writeto_mem(self.address, register, data)
 
     def _register(self, register, value=None, struct='B'):
-        if value is None:
+        if struct == 'B':
+            buffer = self._byte
+            if value is None:
+                self.i2c.readfrom_mem_into(self.address, register, buffer)
+                return buffer[0]
+            buffer[0] = value & 0xFF
+            self.i2c.writeto_mem(self.address, register, buffer)
+        elif struct == '>H':
+            buffer = self._word
+            if value is None:
+                self.i2c.readfrom_mem_into(self.address, register, buffer)
+                return (buffer[0] << 8) | buffer[1]
+            buffer[0] = (value >> 8) & 0xFF
+            buffer[1] = value & 0xFF
+            self.i2c.writeto_mem(self.address, register, buffer)
+        elif value is None:
             return self._registers(register, struct=struct)[0]
-        self._registers(register, (value,), struct=struct)
+        else:
+            self._registers(register, (value,), struct=struct)
 
     def _flag(self, register=0x00, bit=0, value=None):
         data = self._register(register)
@@ -169,7 +336,27 @@ class VL53L0X():
         for register, value in config:
             self._register(register, value)
 
-    def init(self, power2v8=True):
+    def _write_sequence(self, sequence):
+        # sequence holds (register, value) pairs flattened into one bytes object
+        pair = self._pair
+        for i in range(0, len(sequence), 2):
+            pair[0] = sequence[i]
+            pair[1] = sequence[i + 1]
+            self.i2c.writeto(self.address, pair)
+
+    def init(self, power2v8=True, calibration=None):
+        """Initialise the sensor, reusing a result of get_calibration() if possible.
+
+        A calibration is only reused if it is well formed and its stop variable and
+        SPAD count and type (from the device's NVM) match, otherwise (and without one)
+        the SPADs are configured and the reference calibration runs. calibrated tells
+        which of both happened.
+        """
+        for ms in self.init_steps(power2v8, calibration):
+            utime.sleep_ms(ms)
+
+    def init_steps(self, power2v8=True, calibration=None):
+        """init() in steps, see restart_steps()."""
         self._flag(_EXTSUP_HV, 0, power2v8)
 
         # I2C standard mode
@@ -186,6 +373,25 @@ class VL53L0X():
             (0xff, 0x00),
             (0x80, 0x00),
         )
+        # the sequences used for every measurement only depend on the stop variable
+        self._start_sequence = bytes((
+            0x80, 0x01,
+            0xFF, 0x01,
+            0x00, 0x00,
+            0x91, self._stop_variable,
+            0x00, 0x01,
+            0xFF, 0x00,
+            0x80, 0x00,
+        ))
+        self._trigger_sequence = self._start_sequence + bytes((_SYSRANGE_START, 0x01))
+        self._stop_sequence = bytes((
+            _SYSRANGE_START, 0x01,
+            0xFF, 0x01,
+            0x00, 0x00,
+            0x91, self._stop_variable,
+            0x00, 0x01,
+            0xFF, 0x00,
+        ))
 
         # disable signal_rate_msrc and signal_rate_pre_range limit checks
         self._flag(_MSRC_CONFIG, 1, True)
@@ -197,8 +403,19 @@ class VL53L0X():
 
         self._register(_SYSTEM_SEQUENCE, 0xff)
 
-        spad_count, is_aperture = self._spad_info()
-        spad_map = bytearray(self._registers(_SPAD_ENABLES, struct='6B'))
+        spad_count, is_aperture = yield from self._spad_info()
+        yield 0  # a break in the I2C traffic for the others on the bus
+        self._spad_count = spad_count
+        self._is_aperture = is_aperture
+        if calibration is not None and not self._matches(calibration):
+            calibration = None  # taken from another device, or malformed
+        self.calibrated = calibration is None
+
+        if self.calibrated:
+            spad_map = bytearray(6)
+            self.i2c.readfrom_mem_into(self.address, _SPAD_ENABLES, spad_map)
+        else:
+            spad_map = bytearray(calibration["spad_map"])
 
         # set reference spads
         self._config(
@@ -209,14 +426,15 @@ class VL53L0X():
             (_REF_EN_START_SELECT, 0xb4),
         )
 
-        spads_enabled = 0
-        for i in range(48):
-            if i < 12 and is_aperture or spads_enabled >= spad_count:
-                spad_map[i // 8] &= ~(1 << (i >> 2))
-            elif spad_map[i // 8] & (1 << (i >> 2)):
-                spads_enabled += 1
+        if self.calibrated:
+            spads_enabled = 0
+            for i in range(48):
+                if i < 12 and is_aperture or spads_enabled >= spad_count:
+                    spad_map[i // 8] &= ~(1 << (i % 8))
+                elif spad_map[i // 8] & (1 << (i % 8)):
+                    spads_enabled += 1
 
-        self._registers(_SPAD_ENABLES, spad_map, struct='6B')
+        self.i2c.writeto_mem(self.address, _SPAD_ENABLES, spad_map)
 
         self._config(
             (0xff, 0x01),
@@ -318,18 +536,67 @@ class VL53L0X():
         self._flag(_GPIO_MUX_ACTIVE_HIGH, 4, False)
         self._register(_INTERRUPT_CLEAR, 0x01)
 
-        # XXX Need to implement this.
-        # budget = self._timing_budget()
-        # self._register(_SYSTEM_SEQUENCE, 0xe8)
-        # self._timing_budget(budget)
+        yield 0
+        # disable MSRC and TCC and give their time to the final range
+        budget = self.get_measurement_timing_budget()
+        self._register(_SYSTEM_SEQUENCE, 0xe8)
+        self.set_measurement_timing_budget(budget)
 
-        self._register(_SYSTEM_SEQUENCE, 0x01)
-        self._calibrate(0x40)
-        self._register(_SYSTEM_SEQUENCE, 0x02)
-        self._calibrate(0x00)
+        if self.calibrated:
+            self._register(_SYSTEM_SEQUENCE, 0x01)
+            yield from self._calibrate(0x40)
+            self._register(_SYSTEM_SEQUENCE, 0x02)
+            yield from self._calibrate(0x00)
+        else:
+            self._ref_calibration(calibration["vhv"], calibration["phase_cal"])
 
         self._register(_SYSTEM_SEQUENCE, 0xe8)
 
+    def _matches(self, calibration):
+        try:
+            return (calibration["stop_variable"] == self._stop_variable
+                    and calibration["spad_info"] == [self._spad_count, self._is_aperture]
+                    and len(calibration["spad_map"]) == 6
+                    and all(0 <= value <= 0xff for value in calibration["spad_map"])
+                    and 0 <= calibration["vhv"] <= 0xff
+                    and 0 <= calibration["phase_cal"] <= 0xff)
+        except (KeyError, IndexError, TypeError, ValueError):
+            return False
+
+    def get_calibration(self):
+        """Device specific calibration data that can be passed to init() later."""
+        spad_map = bytearray(6)
+        self.i2c.readfrom_mem_into(self.address, _SPAD_ENABLES, spad_map)
+        vhv, phase_cal = self._ref_calibration()
+        return {
+            "stop_variable": self._stop_variable,
+            "spad_info": [self._spad_count, self._is_aperture],
+            "spad_map": list(spad_map),
+            "vhv": vhv,
+            "phase_cal": phase_cal,
+            "vcsel_periods": [self.get_vcsel_pulse_period(type) for type in self.vcsel_period_type],
+        }
+
+    def _ref_calibration(self, vhv=None, phase_cal=None):
+        # read or (with arguments) restore the VHV and phase calibration results
+        self._config(
+            (0xFF, 0x01),
+            (0x00, 0x00),
+            (0xFF, 0x00),
+        )
+        if vhv is None:
+            vhv = self._register(_VHV_SETTINGS)
+            phase_cal = self._register(_PHASE_CAL) & 0xEF
+        else:
+            self._register(_VHV_SETTINGS, vhv)
+            self._register(_PHASE_CAL, (self._register(_PHASE_CAL) & 0x80) | phase_cal)
+        self._config(
+            (0xFF, 0x01),
+            (0x00, 0x01),
+            (0xFF, 0x00),
+        )
+        return vhv, phase_cal
+
     def _spad_info(self):
         self._config(
             (0x80, 0x01),
@@ -348,12 +615,7 @@ class VL53L0X():
             (0x94, 0x6b),
             (0x83, 0x00),
         )
-        for timeout in range(_IO_TIMEOUT):
-            if self._register(0x83):
-                break
-            utime.sleep_ms(1)
-        else:
-            raise TimeoutError()
+        yield from self._wait(lambda: self._register(0x83))
         self._config(
             (0x83, 0x01),
         )
@@ -376,25 +638,14 @@ class VL53L0X():
 
     def _calibrate(self, vhv_init_byte):
         self._register(_SYSRANGE_START, 0x01 | vhv_init_byte)
-        for timeout in range(_IO_TIMEOUT):
-            if self._register(_RESULT_INTERRUPT_STATUS) & 0x07:
-                break
-            utime.sleep_ms(1)
-        else:
-            raise TimeoutError()
+        yield from self._wait(lambda: self._register(_RESULT_INTERRUPT_STATUS) & 0x07)
+        self._ready = False  # the calibration's edge on GPIO1, not a result
         self._register(_INTERRUPT_CLEAR, 0x01)
         self._register(_SYSRANGE_START, 0x00)
 
     def start(self, period=0):
-        self._config(
-            (0x80, 0x01),
-            (0xFF, 0x01),
-            (0x00, 0x00),
-            (0x91, self._stop_variable),
-            (0x00, 0x01),
-            (0xFF, 0x00),
-            (0x80, 0x00),
-        )
+        self._write_sequence(self._start_sequence)
+        self._period = period
         if period:
             oscilator = self._register(_OSC_CALIBRATE, struct='>H')
             if oscilator:
@@ -404,50 +655,29 @@ class VL53L0X():
         else:
             self._register(_SYSRANGE_START, 0x02)
         self._started = True
+        self._arm_deadline()
+        self._expect_result()
 
     def stop(self):
-        self._register(_SYSRANGE_START, 0x01)
-        self._config(
-            (0xFF, 0x01),
-            (0x00, 0x00),
-            (0x91, self._stop_variable),
-            (0x00, 0x01),
-            (0xFF, 0x00),
-        )
+        self._write_sequence(self._stop_sequence)
         self._started = False
 
+    def set_address(self, address):
+        """Move the sensor to another 7 bit address, it is back at 0x29 after a reset (XSHUT) or power cycle."""
+        self._register(I2C_SLAVE_DEVICE_ADDRESS, address & 0x7f)
+        self.address = address
+
     def read(self):
         if not self._started:
-            self._config(
-                (0x80, 0x01),
-                (0xFF, 0x01),
-                (0x00, 0x00),
-                (0x91, self._stop_variable),
-                (0x00, 0x01),
-                (0xFF, 0x00),
-                (0x80, 0x00),
-                (_SYSRANGE_START, 0x01),
-            )
-            for timeout in range(_IO_TIMEOUT):
-                if not self._register(_SYSRANGE_START) & 0x01:
-                    break
-                utime.sleep_ms(1)
-            else:
-                raise TimeoutError()
-        for timeout in range(_IO_TIMEOUT):
-            if self._register(_RESULT_INTERRUPT_STATUS) & 0x07:
-                break
+            self.trigger()
+        while not self.data_ready():
             utime.sleep_ms(1)
-        else:
-            raise TimeoutError()
-        value = self._register(_RESULT_RANGE_STATUS + 10, struct='>H')
-        self._register(_INTERRUPT_CLEAR, 0x01)
-        return value
+        return self.collect()
 
     def set_signal_rate_limit(self, limit_Mcps):
         if limit_Mcps < 0 or limit_Mcps > 511.99:
             return False
-        self._register(0x44, limit_Mcps * (1 << 7))
+        self._register(FINAL_RANGE_CONFIG_MIN_COUNT_RATE_RTN_LIMIT, int(limit_Mcps * (1 << 7)), struct='>H')
         return True
 
     def decode_Vcsel_period(self, reg_val):
@@ -456,7 +686,7 @@ class VL53L0X():
     def encode_Vcsel_period(self, period_pclks):
         return (((period_pclks) >> 1) - 1)
 
-    def set_Vcsel_pulse_period(self, type, period_pclks):
+    def set_Vcsel_pulse_period(self, type, period_pclks, calibrate=True):
         vcsel_period_reg = self.encode_Vcsel_period(period_pclks)
 
         self.get_sequence_step_enables()
@@ -479,11 +709,12 @@ class VL53L0X():
 
             new_pre_range_timeout_mclks = self.timeout_microseconds_to_Mclks(self.timeouts["pre_range_us"],
                                                                              period_pclks)
-            self._register(PRE_RANGE_CONFIG_TIMEOUT_MACROP_HI, self.encode_timeout(new_pre_range_timeout_mclks))
+            self._register(PRE_RANGE_CONFIG_TIMEOUT_MACROP_HI, self.encode_timeout(new_pre_range_timeout_mclks),
+                           struct='>H')
 
             new_msrc_timeout_mclks = self.timeout_microseconds_to_Mclks(self.timeouts["msrc_dss_tcc_us"],
                                                                         period_pclks)
-            self._register(MSRC_CONFIG_TIMEOUT_MACROP, 255 if new_msrc_timeout_mclks > 256 else (new_msrc_timeout_mclks - 1))
+            self._register(MSRC_CONFIG_TIMEOUT_MACROP, 255 if new_msrc_timeout_mclks > 256 else int(new_msrc_timeout_mclks - 1))
         elif type == self.vcsel_period_type[1]:
             if period_pclks == 8:
                 self._register(FINAL_RANGE_CONFIG_VALID_PHASE_HIGH, 0x10)
@@ -525,15 +756,17 @@ class VL53L0X():
             new_final_range_timeout_mclks = self.timeout_microseconds_to_Mclks(self.timeouts["final_range_us"], period_pclks)
 
             if self.enables["pre_range"]:
-                new_final_range_timeout_mclks += 1
-            self._register(FINAL_RANGE_CONFIG_TIMEOUT_MACROP_HI, self.encode_timeout(new_final_range_timeout_mclks))
+                new_final_range_timeout_mclks += self.timeouts["pre_range_mclks"]
+            self._register(FINAL_RANGE_CONFIG_TIMEOUT_MACROP_HI, self.encode_timeout(new_final_range_timeout_mclks),
+                           struct='>H')
         else:
             return False
         self.set_measurement_timing_budget(self.measurement_timing_budget_us)
-        sequence_config = self._register(SYSTEM_SEQUENCE_CONFIG)
-        self._register(SYSTEM_SEQUENCE_CONFIG, 0x02)
-        self.perform_single_ref_calibration(0x0)
-        self._register(SYSTEM_SEQUENCE_CONFIG, sequence_config)
+        if calibrate:
+            sequence_config = self._register(SYSTEM_SEQUENCE_CONFIG)
+            self._register(SYSTEM_SEQUENCE_CONFIG, 0x02)
+            self.perform_single_ref_calibration(0x0)
+            self._register(SYSTEM_SEQUENCE_CONFIG, sequence_config)
 
         return True
 
@@ -548,9 +781,9 @@ class VL53L0X():
 
     def get_vcsel_pulse_period(self, type):
         if type == self.vcsel_period_type[0]:
-            return self.decode_Vcsel_period(0x50)
+            return self.decode_Vcsel_period(self._register(PRE_RANGE_CONFIG_VCSEL_PERIOD))
         elif type == self.vcsel_period_type[1]:
-            return self.decode_Vcsel_period(0x70)
+            return self.decode_Vcsel_period(self._register(FINAL_RANGE_CONFIG_VCSEL_PERIOD))
         else:
             return 255
 
@@ -560,12 +793,14 @@ class VL53L0X():
         self.timeouts["msrc_dss_tcc_us"] = self.timeout_Mclks_to_microseconds(self.timeouts["msrc_dss_tcc_mclks"],
                                                                               self.timeouts[
                                                                                   "pre_range_vcsel_period_pclks"])
-        self.timeouts["pre_range_mclks"] = self.decode_timeout(PRE_RANGE_CONFIG_TIMEOUT_MACROP_HI)
+        self.timeouts["pre_range_mclks"] = self.decode_timeout(self._register(PRE_RANGE_CONFIG_TIMEOUT_MACROP_HI,
+                                                                              struct='>H'))
         self.timeouts["pre_range_us"] = self.timeout_Mclks_to_microseconds(self.timeouts["pre_range_mclks"],
                                                                            self.timeouts[
                                                                                "pre_range_vcsel_period_pclks"])
         self.timeouts["final_range_vcsel_period_pclks"] = self.get_vcsel_pulse_period(self.vcsel_period_type[1])
-        self.timeouts["final_range_mclks"] = self.decode_timeout(self._register(FINAL_RANGE_CONFIG_TIMEOUT_MACROP_HI))
+        self.timeouts["final_range_mclks"] = self.decode_timeout(self._register(FINAL_RANGE_CONFIG_TIMEOUT_MACROP_HI,
+                                                                                struct='>H'))
 
         if self.enables["pre_range"]:
             self.timeouts["final_range_mclks"] -= self.timeouts["pre_range_mclks"]
@@ -598,38 +833,46 @@ class VL53L0X():
             while (ls_byte & 0xFFFFFF00) > 0:
                 ls_byte >>= 1
                 ms_byte += 1
-            return (ms_byte << 8) or (ls_byte & 0xFF)
+            return (ms_byte << 8) | (ls_byte & 0xFF)
         else:
             return 0
 
-    def set_measurement_timing_budget(self, budget_us):
-        start_overhead = 1320
-        end_overhead = 960
-        msrc_overhead = 660
-        tcc_overhead = 590
-        dss_overhead = 690
-        pre_range_overhead = 660
-        final_range_overhead = 550
+    def get_measurement_timing_budget(self):
+        budget_us = _START_OVERHEAD + _END_OVERHEAD
 
-        min_timing_budget = 20000
+        self.get_sequence_step_enables()
+        self.get_sequence_step_timeouts()
 
-        if budget_us < min_timing_budget:
+        if self.enables["tcc"]:
+            budget_us += self.timeouts["msrc_dss_tcc_us"] + _TCC_OVERHEAD
+        if self.enables["dss"]:
+            budget_us += 2 * (self.timeouts["msrc_dss_tcc_us"] + _DSS_OVERHEAD)
+        elif self.enables["msrc"]:
+            budget_us += self.timeouts["msrc_dss_tcc_us"] + _MSRC_OVERHEAD
+        if self.enables["pre_range"]:
+            budget_us += self.timeouts["pre_range_us"] + _PRE_RANGE_OVERHEAD
+        if self.enables["final_range"]:
+            budget_us += self.timeouts["final_range_us"] + _FINAL_RANGE_OVERHEAD
+        return int(budget_us)
+
+    def set_measurement_timing_budget(self, budget_us):
+        if budget_us < _MIN_TIMING_BUDGET:
             return False
-        used_budget_us = start_overhead + end_overhead
+        used_budget_us = _SET_START_OVERHEAD + _END_OVERHEAD
 
         self.get_sequence_step_enables()
         self.get_sequence_step_timeouts()
 
         if self.enables["tcc"]:
-            used_budget_us += self.timeouts["msrc_dss_tcc_us"] + tcc_overhead
+            used_budget_us += self.timeouts["msrc_dss_tcc_us"] + _TCC_OVERHEAD
         if self.enables["dss"]:
-            used_budget_us += 2* self.timeouts["msrc_dss_tcc_us"] + dss_overhead
-        if self.enables["msrc"]:
-            used_budget_us += self.timeouts["msrc_dss_tcc_us"] + msrc_overhead
+            used_budget_us += 2 * (self.timeouts["msrc_dss_tcc_us"] + _DSS_OVERHEAD)
+        elif self.enables["msrc"]:
+            used_budget_us += self.timeouts["msrc_dss_tcc_us"] + _MSRC_OVERHEAD
         if self.enables["pre_range"]:
-            used_budget_us += self.timeouts["pre_range_us"] + pre_range_overhead
+            used_budget_us += self.timeouts["pre_range_us"] + _PRE_RANGE_OVERHEAD
         if self.enables["final_range"]:
-            used_budget_us += final_range_overhead
+            used_budget_us += _FINAL_RANGE_OVERHEAD
 
             if used_budget_us > budget_us:
                 return False
@@ -638,25 +881,26 @@ class VL53L0X():
 
             if self.enables["pre_range"]:
                 final_range_timeout_mclks += self.timeouts["pre_range_mclks"]
-            self._register(FINAL_RANGE_CONFIG_TIMEOUT_MACROP_HI, self.encode_timeout(final_range_timeout_mclks))
+            self._register(FINAL_RANGE_CONFIG_TIMEOUT_MACROP_HI, self.encode_timeout(final_range_timeout_mclks),
+                           struct='>H')
             self.measurement_timing_budget_us = budget_us
         return True
 
+    def phase_calibration_steps(self):
+        """The calibration set_Vcsel_pulse_period() runs after a change, in steps (see restart_steps())."""
+        sequence_config = self._register(SYSTEM_SEQUENCE_CONFIG)
+        self._register(SYSTEM_SEQUENCE_CONFIG, 0x02)
+        yield from self._calibrate(0x0)
+        self._register(SYSTEM_SEQUENCE_CONFIG, sequence_config)
+
     def perform_single_ref_calibration(self, vhv_init_byte):
-        
-        # Pico MicroPython doesn't have a Chrono class, so the line below is commented out
-        # chrono = Timer.Chrono()
-        
         self._register(SYSRANGE_START, 0x01|vhv_init_byte)
-
-        # Instead of using the chrono class, I'll just capture the current time
-        chrono_start = utime.ticks_ms()
-        while self._register((RESULT_INTERRUPT_STATUS & 0x07) == 0):
-
-            # elapsed time is juse the current time minus the start time.
-            time_elapsed = utime.ticks_ms() - chrono_start
-            if time_elapsed > _IO_TIMEOUT:
+        deadline = utime.ticks_add(utime.ticks_ms(), self.io_timeout_ms)
+        while (self._register(RESULT_INTERRUPT_STATUS) & 0x07) == 0:
+            if utime.ticks_diff(utime.ticks_ms(), deadline) > 0:
                 return False
+            utime.sleep_ms(1)
+        self._ready = False  # the calibration's edge on GPIO1, not a result
         self._register(SYSTEM_INTERRUPT_CLEAR, 0x01)
         self._register(SYSRANGE_START, 0x00)
         return True
@@ -0,0 +1,22 @@
+"""Fixtures for running the scripts against the simulation package."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simulation  # noqa: E402
+from simulation import i2c, europi_script, machine  # noqa: E402
+
+
+@pytest.fixture
+def sim():
+    """A fresh simulated clock and empty buses, returns the simulation package."""
+    i2c._buses.clear()
+    europi_script.saved_states.clear()
+    machine.ADC.temperature = 27.0
+    simulation.install(simulation.Clock())
+    yield simulation
+    i2c._buses.clear()
@@ -0,0 +1,211 @@
+"""Runtimes and drivers of Sensitive EuroPi against the simulation package."""
+
+import json
+import sys
+import threading
+
+import pytest
+
+
+def test_slot_reads_are_never_torn(sim):
+    from sensitive_euro_pi_dual import Slot
+
+    slot = Slot()
+    writes = 300000
+    torn = []
+
+    def write():
+        for millivolts in range(1, writes + 1):
+            slot.write(millivolts & 1 == 1, millivolts)  # valid tells the parity of millivolts
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads as often as possible
+    try:
+        writer = threading.Thread(target=write)
+        writer.start()
+        last = 0
+        while writer.is_alive() or last < writes:
+            slot.read()
+            if slot.valid != (slot.millivolts & 1 == 1) or slot.millivolts < last:
+                torn.append((slot.valid, slot.millivolts))
+            last = slot.millivolts
+        writer.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert not torn
+    assert slot.millivolts == writes
+
+
+def test_slot_read_retries_while_the_next_buffer_is_written(sim):
+    # what the other core may do between the reader taking the sequence and copying
+    from sensitive_euro_pi_dual import Slot
+
+    class Interleaved(list):
+        def __init__(self, slot, values):
+            super().__init__(values)
+            self.slot = slot
+            self.interleave = True
+
+        def __getitem__(self, index):
+            if self.interleave:
+                self.interleave = False
+                self.slot.write(True, 2000)  # published
+                self[index] = 0  # the next write has only got to valid in the buffer being copied
+            return super().__getitem__(index)
+
+    slot = Slot()
+    slot.write(True, 1000)
+    slot.buffers = Interleaved(slot, slot.buffers)
+    slot.read()
+    assert (slot.valid, slot.millivolts) == (True, 2000)
+
+
+def test_async_runtime_waits_for_results_instead_of_polling(sim):
+    clock = sim.install(sim.Clock(realtime=True))
+    model = sim.attach(sim.VL53L0XModel(distance=300))
+    from europi import cv1
+    from sensitive_euro_pi_async import AsyncSensitiveEuroPi
+
+    script = AsyncSensitiveEuroPi()
+    polls = []
+    update_sensor = script.update_sensor
+
+    def count(sensor):
+        if sensor.index == 0:
+            polls.append(clock.now_us())
+            if len(polls) == 1:
+                raise MemoryError  # the coroutine collects and goes on
+        update_sensor(sensor)
+
+    script.update_sensor = count
+    clock.limit_us = clock.now_us() + 2000000  # the splash screen takes the first second
+    with pytest.raises(sim.SimulationFinished):
+        script.main()
+    results = len(model.result_times)
+    assert script.scheduler is None
+    assert script.memory.emergencies == 1
+    assert results > 20
+    assert len(polls) < 8 * results  # a 1 ms poll loop takes about 30 per result
+    assert cv1.voltage() == pytest.approx(2.7)
+
+
+@pytest.mark.parametrize("distance, max_range_mm, valid, volts", [
+    (400, 4500, True, 3.7),
+    (None, 4500, False, None),  # no echo, reads 0
+    (10, 4500, False, None),  # too close
+    (5000, 6000, False, None),  # beyond what the HC-SR04 can tell
+])
+def test_hcsr04_echoes(sim, distance, max_range_mm, valid, volts):
+    model = sim.attach(sim.HCSR04Model(distance=distance, max_range_mm=max_range_mm))
+    from europi import cv2, cv5
+    from sensitive_euro_pi import SensitiveEuroPi
+
+    script = SensitiveEuroPi()
+    sensor = script.sensors[1]
+    script.main(300)
+    assert sensor.active
+    assert len(model.result_times) >= 3
+    assert sensor.task.max_us < 1000  # the echo never blocks the loop
+    assert sensor.reading.valid is valid
+    assert cv5.value() == (1 if valid else 0)
+    if valid:
+        assert cv2.voltage() == pytest.approx(volts)
+
+
+def test_sensor_behind_a_multiplexer_channel(sim):
+    mux = sim.attach(sim.TCA9548AModel())
+    mux.attach(3, sim.VL53L0XModel(distance=300))
+    sim.europi_script.saved_states["SensitiveEuroPi"] = json.dumps({"sensors": [
+        {"type": "vl53l0x", "mux_channel": 3},
+    ]})
+    from europi import cv1
+    from sensitive_euro_pi import SensitiveEuroPi
+
+    script = SensitiveEuroPi()
+    sensor = script.sensors[0]
+    script.main(300)
+    assert sensor.active
+    assert sensor.bus is script.mux.channel(3)
+    assert mux.switches == 1  # the only channel in use stays selected
+    assert cv1.voltage() == pytest.approx(2.7)
+
+
+def test_i2c_stats_count_the_transfers_of_every_sensor(sim):
+    sim.attach(sim.VL53L0XModel(distance=300))
+    sim.attach(sim.BH1750Model(lux=300))
+    sim.europi_script.saved_states["SensitiveEuroPi"] = json.dumps({"i2c_stats": True})
+    from europi import cv1
+    from sensitive_euro_pi import SensitiveEuroPi
+
+    script = SensitiveEuroPi()
+    script.main(300)
+    stats = script.i2c_stats.addresses
+    assert script.sensors[0].active and script.sensors[2].active
+    assert stats[0x29][0] > 100 and stats[0x23][0] > 3
+    assert stats[0x29][2] == stats[0x23][2] == 0  # no errors
+    assert sum(stats[0x29][4:]) == stats[0x29][0]  # every transfer is in the histogram
+    assert 0x29 << 8 | 0x13 in script.i2c_stats.registers  # the interrupt status is polled
+    assert cv1.voltage() == pytest.approx(2.7)
+
+
+def test_recovery_initialises_a_vl53l0x_step_by_step(sim):
+    sim.attach(sim.BH1750Model(lux=300))
+    clock = sim.clock.current
+    # plugged in after the start, so the recovery task has to calibrate it
+    clock.call_later(500000, lambda: sim.attach(sim.VL53L0XModel(distance=300)))
+    from europi import cv1
+    from sensitive_euro_pi import SensitiveEuroPi
+
+    script = SensitiveEuroPi()
+    assert not script.sensors[0].active
+    clock.limit_us = clock.now_us() + 4000000
+    with pytest.raises(sim.SimulationFinished):
+        script.main()
+    tof, lux = script.sensors[0], script.sensors[2]  # the driver was loaded on the way
+    recovery = next(task for task in script.scheduler.tasks if task.name == "recovery")
+    assert tof.active and tof.vl53l0x.calibrated
+    assert "calibration" in script.state[tof.name]
+    assert recovery.overruns == 0 and recovery.max_us < 10000  # a full calibration blocks for over 100 ms
+    assert lux.task.overruns == 0
+    assert cv1.voltage() == pytest.approx(2.7)
+
+
+def test_vl53l0x_calibration_is_saved_once_and_renewed_for_a_change_in_temperature(sim):
+    sim.attach(sim.VL53L0XModel(distance=300))
+    from sensitive_euro_pi import SensitiveEuroPi
+
+    script = SensitiveEuroPi()
+    sensor = script.sensors[0]
+    settings = script.state[sensor.name]
+    assert sensor.vl53l0x.calibrated and settings["calibration"]["temperature"] == 27
+    for temperature, calibrated in ((33, False), (33, False), (36, True)):
+        script.state_changed = False
+        sim.machine.ADC.temperature = temperature
+        sim.bus(sim.SENSOR_BUS).detach(0x29)  # power cycled
+        sim.attach(sim.VL53L0XModel(distance=300))
+        sensor.reset()
+        script.activate_sensor(sensor)
+        assert sensor.active
+        assert sensor.vl53l0x.calibrated is calibrated
+        assert script.state_changed is calibrated  # reusing the calibration doesn't write the flash
+    assert settings["calibration"]["temperature"] == 36
+
+
+def test_output_engine_ramps_in_pwm_duty_cycles(sim):
+    from europi import cv1
+    from output_engine import OutputEngine, DUTIES
+
+    engine = OutputEngine(1000)
+    channel = engine.add(cv1)
+    channel.set(2700)
+    engine.tick()
+    assert cv1._duty == DUTIES[2] + (DUTIES[3] - DUTIES[2]) * 7 // 10
+    assert cv1.voltage() == pytest.approx(2.7, abs=0.001)
+    sim.clock.current.sleep_us(10000)
+    channel.set(5000)  # ramps over the 10 ms since the last reading
+    ramp = []
+    for _ in range(10):
+        engine.tick()
+        ramp.append(cv1.voltage())
+    assert ramp == sorted(ramp) and ramp[4] == pytest.approx(3.85, abs=0.01)
+    assert cv1._duty == DUTIES[5]